@@ -0,0 +1 @@
+"""Application packages (schemas)."""
@@ -14,6 +14,36 @@ def create_app(config_name=None):
     
     # 初始化扩展
     init_db(app)
+
+    # 初始化菜單快照快取與價格表
+    from utils.menu_cache import init_menu_cache
+    init_menu_cache(app)
+    from utils.pricing import init_pricing
+    init_pricing(app)
+
+    # 初始化遊客購物車存儲
+    from utils.cart_store import init_cart_store
+    init_cart_store(app)
+
+    # 初始化訂單號生成器
+    from utils.order_numbers import init_order_numbers
+    init_order_numbers(app)
+
+    # 初始化訂單狀態推送
+    from utils.order_events import init_order_events
+    init_order_events(app)
+
+    # 初始化後台統計計數
+    from utils.counters import init_counters
+    init_counters(app)
+
+    # 初始化圖片處理管線
+    from utils.image_pipeline import init_image_pipeline
+    init_image_pipeline(app)
+
+    # 註冊命令行工具
+    from utils.cli import init_cli
+    init_cli(app)
     
     # 初始化登录管理器
     login_manager = LoginManager()
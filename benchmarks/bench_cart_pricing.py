@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Cart Pricing Micro-benchmark
+Price a 30-line cart with 5 ingredients per line using linear ingredient scans
+versus the versioned price table / ingredient index
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application import create_app
+from database import db
+from models import Cart, CartItem, Product, ProductIngredient
+
+LINES = 30
+INGREDIENTS_PER_LINE = 5
+ROUNDS = 200
+
+
+def seed(app):
+    """建立 30 行、每行 5 種配料的購物車"""
+    with app.app_context():
+        db.create_all()
+        cart = Cart(session_id='bench')
+        db.session.add(cart)
+        db.session.flush()
+        for i in range(LINES):
+            product = Product(name=f'Drink {i}', price=60, special_price=0,
+                              cold_price=65, hot_price=0, is_active=True)
+            db.session.add(product)
+            db.session.flush()
+            ingredients = []
+            for j in range(INGREDIENTS_PER_LINE * 2):
+                ingredient = ProductIngredient(product_id=product.id, name=f'Topping {j}', price=5 + j)
+                db.session.add(ingredient)
+                ingredients.append(ingredient)
+            db.session.flush()
+            item = CartItem(cart_id=cart.id, product_id=product.id, quantity=2, temperature='cold')
+            # 舊格式：只存配料 ID
+            item.set_ingredients([ing.id for ing in ingredients[-INGREDIENTS_PER_LINE:]])
+            db.session.add(item)
+        db.session.commit()
+        return cart.id
+
+
+def legacy_total(cart):
+    """改版前的算法：每個配料 ID 線性掃描 product.ingredients"""
+    total = 0
+    for item in cart.cart_items:
+        total += item.product.get_price(item.temperature) * item.quantity
+        for ingredient_id in item.ingredients or []:
+            for prod_ingredient in item.product.ingredients:
+                if prod_ingredient.id == ingredient_id:
+                    total += float(prod_ingredient.price) * item.quantity
+                    break
+    return total
+
+
+def indexed_total(cart):
+    """價格表與配料索引"""
+    return cart.get_total_amount()
+
+
+def run(app, cart_id, func):
+    """每輪使用新的 session，包含載入成本"""
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            db.session.expire_all()
+            total = func(db.session.get(Cart, cart_id))
+        elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+    return total, elapsed
+
+
+def main():
+    print("=" * 60)
+    print(f"Cart Pricing Benchmark ({LINES} lines x {INGREDIENTS_PER_LINE} ingredients)")
+    print("=" * 60)
+
+    app = create_app('testing')
+    cart_id = seed(app)
+
+    legacy = run(app, cart_id, legacy_total)
+    indexed = run(app, cart_id, indexed_total)
+    assert abs(legacy[0] - indexed[0]) < 0.01, (legacy[0], indexed[0])
+
+    print(f"linear scan:    total={legacy[0]:.2f}  {legacy[1]:.3f} ms/cart")
+    print(f"indexed lookup: total={indexed[0]:.2f}  {indexed[1]:.3f} ms/cart")
+
+
+if __name__ == '__main__':
+    main()
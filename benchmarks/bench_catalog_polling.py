@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Catalog Polling Benchmark
+Compare bytes and latency of a polling client with and without If-None-Match
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from application import create_app
+from database import db
+from models import Product, ProductImage, ProductIngredient
+
+PRODUCTS = 200
+POLLS = 500
+
+
+def seed(app):
+    """建立測試菜單"""
+    with app.app_context():
+        db.create_all()
+        for i in range(PRODUCTS):
+            product = Product(name=f'Product {i}', price=50 + i % 30, special_price=0,
+                              cold_price=0, hot_price=0, description='x' * 80, is_active=True)
+            db.session.add(product)
+            db.session.flush()
+            db.session.add(ProductImage(product_id=product.id, image=f'product/{product.id}/a.webp'))
+            for j in range(3):
+                db.session.add(ProductIngredient(product_id=product.id, name=f'Topping {j}', price=10))
+        db.session.commit()
+
+
+def poll(client, url, conditional):
+    """模擬輪詢客戶端，返回 (總字節數, 平均延遲毫秒)"""
+    etag = None
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(POLLS):
+        headers = {'If-None-Match': etag} if conditional and etag else {}
+        response = client.get(url, headers=headers)
+        total_bytes += len(response.get_data())
+        etag = response.headers.get('ETag', etag)
+    elapsed = time.perf_counter() - start
+    return total_bytes, elapsed / POLLS * 1000
+
+
+def main():
+    print("=" * 60)
+    print(f"Catalog Polling Benchmark ({PRODUCTS} products, {POLLS} polls)")
+    print("=" * 60)
+
+    app = create_app('testing')
+    seed(app)
+    client = app.test_client()
+
+    for url in ('/api/products', '/api/products/1', '/'):
+        before = poll(client, url, conditional=False)
+        after = poll(client, url, conditional=True)
+        print(f"{url}")
+        print(f"  before: {before[0]:>10} bytes  {before[1]:.3f} ms/poll")
+        print(f"  after:  {after[0]:>10} bytes  {after[1]:.3f} ms/poll")
+
+
+if __name__ == '__main__':
+    main()
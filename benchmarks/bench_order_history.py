@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Order History Query-count Check
+Render the customer /orders page for users with short and long histories and
+assert the number of SQL statements per request stays the same
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from application import create_app
+from database import db
+from models import Order, OrderItem, Product, ProductImage, User
+
+ITEMS_PER_ORDER = 3
+HISTORIES = (5, 50)
+ROUNDS = 20
+
+
+def seed(app):
+    """建立產品（各兩張圖片）與兩位歷史長度不同的用戶；舊訂單項目沒有縮圖快照"""
+    with app.app_context():
+        db.create_all()
+        products = []
+        for i in range(ITEMS_PER_ORDER * 2):
+            product = Product(name=f'Drink {i}', price=50, is_active=True)
+            db.session.add(product)
+            db.session.flush()
+            for sort in range(2):
+                db.session.add(ProductImage(product_id=product.id, image=f'p{i}_{sort}.jpg', sort=sort))
+            products.append(product)
+
+        users = []
+        for count in HISTORIES:
+            user = User(name=f'User {count}', email=f'user{count}@example.com')
+            user.set_password('secret')
+            db.session.add(user)
+            db.session.flush()
+            for n in range(count):
+                order = Order(user_id=user.id, customer_name='Bench', customer_phone='0900',
+                              total_amount=150)
+                db.session.add(order)
+                db.session.flush()
+                for j in range(ITEMS_PER_ORDER):
+                    product = products[(n + j) % len(products)]
+                    db.session.add(OrderItem(
+                        order_id=order.id, product_id=product.id, product_name=product.name,
+                        product_price=50, quantity=1, line_total=50,
+                        product_image=product.images[0].image if j % 2 else None
+                    ))
+            users.append(user.email)
+        db.session.commit()
+        return users
+
+
+def measure(app, email):
+    """返回 (每次請求的查詢數, 平均耗時 ms)"""
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': 'secret'})
+    assert response.status_code == 302, response.status_code
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # 請求需在各自的應用上下文中執行，否則會共用同一個 session 的快取
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            response = client.get('/orders')
+            assert response.status_code == 200, response.status_code
+        elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return len(statements) / ROUNDS, elapsed
+
+
+def main():
+    print("=" * 60)
+    print(f"Order History Query Count ({ITEMS_PER_ORDER} items per order)")
+    print("=" * 60)
+
+    app = create_app('testing')
+    users = seed(app)
+
+    results = [measure(app, email) for email in users]
+    for history, (queries, elapsed) in zip(HISTORIES, results):
+        print(f"{history:3d} orders: {queries:g} queries/request  {elapsed:.3f} ms/request")
+
+    # 查詢數不得隨歷史訂單數增長
+    assert len({queries for queries, _ in results}) == 1, results
+    print("OK: query count is independent of order history")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Popularity Analytics Benchmark
+Aggregate N order lines (top sellers, temperature mix, ingredient attach rates)
+with per-row Python dictionaries versus chunked NumPy group-bys
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+
+from application import create_app
+from config import TestingConfig
+from database import db
+from models import Order, OrderItem, Product, ProductIngredient
+from utils.popularity import popularity_report
+
+PRODUCTS = 40
+INGREDIENTS_PER_PRODUCT = 6
+LINES_PER_ORDER = 4
+
+
+def seed(app, lines):
+    """以 executemany 批量寫入 lines 筆訂單項目"""
+    rng = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        ingredients = {}
+        for i in range(PRODUCTS):
+            product = Product(name=f'Drink {i}', price=50, is_active=True)
+            db.session.add(product)
+            db.session.flush()
+            toppings = []
+            for j in range(INGREDIENTS_PER_PRODUCT):
+                ingredient = ProductIngredient(product_id=product.id, name=f'Topping {j}', price=10)
+                db.session.add(ingredient)
+                toppings.append(ingredient)
+            db.session.flush()
+            ingredients[product.id] = [{'id': t.id, 'name': t.name, 'price': 10.0} for t in toppings]
+        product_ids = list(ingredients)
+
+        orders = lines // LINES_PER_ORDER + 1
+        db.session.execute(insert(Order), [{
+            'order_number': f'BENCH-{n:08d}', 'customer_name': 'Bench', 'customer_phone': '0900',
+            'total_amount': 0, 'status': 'completed', 'version': 1, 'created_at': datetime.utcnow()
+        } for n in range(orders)])
+        first_order = db.session.execute(select(Order.id).order_by(Order.id)).scalars().first()
+
+        batch = []
+        for n in range(lines):
+            pid = rng.choice(product_ids)
+            quantity = rng.randint(1, 3)
+            chosen = rng.sample(ingredients[pid], rng.randint(0, 2))
+            batch.append({
+                'order_id': first_order + n // LINES_PER_ORDER, 'product_id': pid,
+                'product_name': f'Drink {pid}', 'product_price': 50, 'quantity': quantity,
+                'line_total': (50 + 10 * len(chosen)) * quantity,
+                'temperature': rng.choice(('normal', 'cold', 'hot')), 'ingredients': chosen
+            })
+            if len(batch) == 20000:
+                db.session.execute(insert(OrderItem), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(OrderItem), batch)
+        db.session.commit()
+
+
+def python_report(limit=10):
+    """逐行以 dict 累加（對照組，讀取方式相同）"""
+    units = defaultdict(int)
+    revenue = defaultdict(float)
+    temperatures = defaultdict(int)
+    attach = defaultdict(int)
+    query = select(OrderItem.product_id, OrderItem.quantity, OrderItem.line_total,
+                   OrderItem.temperature, OrderItem.ingredients)
+    for pid, quantity, line_total, temperature, chosen in db.session.execute(
+            query.execution_options(yield_per=50000)):
+        units[pid] += quantity
+        revenue[pid] += float(line_total)
+        temperatures[(pid, temperature)] += quantity
+        for ingredient in chosen or ():
+            attach[(pid, ingredient['id'])] += quantity
+    top = sorted(units, key=lambda pid: (-units[pid], pid))[:limit]
+    return [(pid, units[pid]) for pid in top]
+
+
+def timed(app, func):
+    with app.app_context():
+        start = time.perf_counter()
+        result = func()
+        return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=200000, help='order lines to seed')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Popularity Analytics Benchmark ({args.lines:,} order lines)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        TestingConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        app = create_app('testing')
+
+        start = time.perf_counter()
+        seed(app, args.lines)
+        print(f"seed:        {time.perf_counter() - start:.2f} s")
+
+        baseline, python_time = timed(app, python_report)
+        report, numpy_time = timed(app, popularity_report)
+        assert [(row['product_id'], row['units']) for row in report] == baseline
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"python dict: {python_time:.2f} s")
+        print(f"numpy:       {numpy_time:.2f} s  ({args.lines / numpy_time:,.0f} lines/s)")
+        print(f"peak RSS:    {peak:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -27,6 +27,44 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
+    # 圖片處理管線：process（進程池轉換，不阻塞請求）或 sync（請求內同步轉換）
+    IMAGE_PIPELINE = os.environ.get('IMAGE_PIPELINE') or 'process'
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+    IMAGE_QUEUE_SIZE = int(os.environ.get('IMAGE_QUEUE_SIZE') or 32)  # 每個 worker 最多排隊的任務數
+
+    # 菜單快照版本文件（多個 worker 共享，預設位於 instance 目錄）
+    MENU_VERSION_FILE = os.environ.get('MENU_VERSION_FILE')
+    # 產品變更日誌保留秒數（游標早於保留範圍的客戶端需全量重同步）
+    PRODUCT_CHANGES_RETENTION = int(os.environ.get('PRODUCT_CHANGES_RETENTION') or 30 * 24 * 3600)
+
+    # 遊客購物車存儲：sqlite（本地 WAL 鍵值存儲）、memory（進程內）或 database（carts 表）
+    GUEST_CART_BACKEND = os.environ.get('GUEST_CART_BACKEND') or 'sqlite'
+    GUEST_CART_STORE = os.environ.get('GUEST_CART_STORE')  # 預設位於 instance 目錄
+    GUEST_CART_TTL = int(os.environ.get('GUEST_CART_TTL') or 7 * 24 * 3600)  # 秒
+
+    # 訂單號生成器：sequence（每日遞增流水號）或 random（舊隨機格式）
+    ORDER_NUMBER_GENERATOR = os.environ.get('ORDER_NUMBER_GENERATOR') or 'sequence'
+    ORDER_NUMBER_BLOCK_SIZE = int(os.environ.get('ORDER_NUMBER_BLOCK_SIZE') or 20)
+
+    # 訂單狀態推送：database（輪詢事件表，支援多 worker）或 memory（單進程）
+    ORDER_EVENT_BROKER = os.environ.get('ORDER_EVENT_BROKER') or 'database'
+    ORDER_EVENT_POLL_INTERVAL = float(os.environ.get('ORDER_EVENT_POLL_INTERVAL') or 1.0)
+    # 單次 SSE 連接最長秒數（需小於 gunicorn 的 worker 超時，結束後由瀏覽器自動重連）
+    ORDER_STREAM_TIMEOUT = int(os.environ.get('ORDER_STREAM_TIMEOUT') or 25)
+
+    # 已完成 / 已取消訂單超過此秒數後移入歸檔表
+    ORDER_ARCHIVE_AFTER = int(os.environ.get('ORDER_ARCHIVE_AFTER') or 90 * 24 * 3600)
+
+    # 後台統計計數分片數（並發寫入分散到不同行）
+    COUNTER_SHARDS = int(os.environ.get('COUNTER_SHARDS') or 16)
+    # 銷售彙總每個 (分桶, 狀態) 的分片數
+    SALES_ROLLUP_SHARDS = int(os.environ.get('SALES_ROLLUP_SHARDS') or 16)
+
+    # 下單冪等鍵保留時間（秒）
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL') or 24 * 3600)
+    # 處理中的鍵超過此秒數未完成時允許重試接手（需大於 gunicorn 的 worker 超時）
+    IDEMPOTENCY_LEASE = int(os.environ.get('IDEMPOTENCY_LEASE') or 60)
+
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
@@ -43,6 +81,9 @@ class TestingConfig(Config):
     """测试环境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    GUEST_CART_BACKEND = 'memory'
+    ORDER_EVENT_BROKER = 'memory'
+    IMAGE_PIPELINE = 'sync'
 
 # 配置字典
 config = {
@@ -31,6 +31,7 @@ cp -r scripts "$PROJECT_DIR/"
 cp wsgi.py "$PROJECT_DIR/"
 cp gunicorn.conf.py "$PROJECT_DIR/"
 cp config_production.py "$PROJECT_DIR/"
+cp upgrade_schema.py "$PROJECT_DIR/"
 cp requirements.txt "$PROJECT_DIR/"
 
 # Set up virtual environment
@@ -51,6 +52,7 @@ echo "Setting up database..."
 cd "$PROJECT_DIR"
 export FLASK_APP=wsgi.py
 flask db upgrade
+python upgrade_schema.py
 
 # Set permissions
 echo "Setting permissions..."
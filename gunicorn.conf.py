@@ -10,7 +10,10 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# 訂單狀態推送（SSE）為長連接：使用 gthread，每個連接只佔用一個線程而非整個 worker；
+# ORDER_STREAM_TIMEOUT 需小於下方 timeout
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -1,13 +1,21 @@
 from .user import User
-from .product import Product, ProductImage, ProductIngredient
+from .product import Product, ProductImage, ProductIngredient, ProductChange
 from .store import Store, StoreImage, store_products
-from .order import Order, OrderItem
+from .order import Order, OrderItem, OrderSequence, OrderEvent
+from .archive import ArchivedOrder, ArchivedOrderItem
 from .cart import Cart, CartItem
+from .idempotency import IdempotencyKey
+from .counter import DashboardCounter
+from .sales import SalesHourly, SalesDaily
 
 __all__ = [
     'User',
-    'Product', 'ProductImage', 'ProductIngredient',
+    'Product', 'ProductImage', 'ProductIngredient', 'ProductChange',
     'Store', 'StoreImage', 'store_products',
-    'Order', 'OrderItem',
-    'Cart', 'CartItem'
+    'Order', 'OrderItem', 'OrderSequence', 'OrderEvent',
+    'ArchivedOrder', 'ArchivedOrderItem',
+    'Cart', 'CartItem',
+    'IdempotencyKey',
+    'DashboardCounter',
+    'SalesHourly', 'SalesDaily'
 ]
@@ -0,0 +1,51 @@
+from datetime import datetime
+from database import db
+from .order import ORDER_STATUSES
+
+class ArchivedOrder(db.Model):
+    """已歸檔訂單（欄位與 orders 相同，保留原訂單ID）"""
+    __tablename__ = 'orders_archive'
+    __table_args__ = (
+        db.Index('ix_orders_archive_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_archive_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+    
+    is_archived = True
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer)
+    order_number = db.Column(db.String(50), unique=True, nullable=False)
+    customer_name = db.Column(db.String(255), nullable=False)
+    customer_phone = db.Column(db.String(20), nullable=False)
+    customer_email = db.Column(db.String(255))
+    total_amount = db.Column(db.Numeric(10, 2), nullable=False)
+    status = db.Column(db.Enum(*ORDER_STATUSES), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    payment_method = db.Column(db.String(50))
+    payment_status = db.Column(db.String(50))
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArchivedOrder {self.order_number}>'
+
+class ArchivedOrderItem(db.Model):
+    """已歸檔訂單項目"""
+    __tablename__ = 'order_items_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders_archive.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    product_name = db.Column(db.String(255), nullable=False)
+    product_price = db.Column(db.Numeric(10, 2), nullable=False)
+    product_image = db.Column(db.String(255))
+    quantity = db.Column(db.Integer, nullable=False)
+    line_total = db.Column(db.Numeric(10, 2), nullable=False)
+    temperature = db.Column(db.Enum('cold', 'hot', 'normal'), default='normal')
+    ingredients = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ArchivedOrderItem {self.product_name} x{self.quantity}>'
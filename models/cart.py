@@ -1,16 +1,30 @@
+from contextlib import nullcontext
 from datetime import datetime
+from sqlalchemy.orm import joinedload
 from database import db
+from .product import Product
+import hashlib
 import json
 
+
+def cart_item_signature(temperature, ingredients):
+    """購物車項目配置簽名：溫度與排序後的配料 ID"""
+    ingredient_ids = sorted(
+        int(ingredient['id'] if isinstance(ingredient, dict) else ingredient)
+        for ingredient in ingredients or []
+    )
+    raw = f"{temperature or 'normal'}|{','.join(map(str, ingredient_ids))}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
 class Cart(db.Model):
     """購物車模型"""
     __tablename__ = 'carts'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # 支持遊客
-    session_id = db.Column(db.String(255), nullable=True)  # 遊客會話ID
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)  # 支持遊客
+    session_id = db.Column(db.String(255), nullable=True, index=True)  # 遊客會話ID
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # 關聯關係
     cart_items = db.relationship('CartItem', backref='cart', lazy='dynamic', cascade='all, delete-orphan')
@@ -21,30 +35,7 @@ class Cart(db.Model):
     
     def get_total_amount(self):
         """獲取購物車總金額"""
-        total = 0
-        for item in self.cart_items:
-            # 基礎價格
-            base_price = item.product.get_price(item.temperature)
-            total += base_price * item.quantity
-            
-            # 添加配料價格
-            if item.ingredients:
-                for ingredient in item.ingredients:
-                    if isinstance(ingredient, dict):
-                        # 如果ingredient是字典，直接獲取price
-                        ingredient_price = float(ingredient.get('price', 0))
-                    else:
-                        # 如果ingredient是ID，從product的ingredients中查找
-                        ingredient_id = ingredient
-                        ingredient_obj = None
-                        for prod_ingredient in item.product.ingredients:
-                            if prod_ingredient.id == ingredient_id:
-                                ingredient_obj = prod_ingredient
-                                break
-                        ingredient_price = float(ingredient_obj.price) if ingredient_obj else 0
-                    
-                    total += ingredient_price * item.quantity
-        return total
+        return sum(item.get_total_price() for item in self.cart_items)
     
     @property
     def total_items(self):
@@ -56,6 +47,87 @@ class Cart(db.Model):
         """購物車總金額（屬性形式）"""
         return self.get_total_amount()
     
+    def load_items(self, with_images=True):
+        """以固定查詢數載入項目及其商品（可選圖片）"""
+        if self.id is None:
+            return []
+        product_loader = joinedload(CartItem.product)
+        if with_images:
+            product_loader = product_loader.selectinload(Product.images)
+        return CartItem.query.options(product_loader).filter_by(
+            cart_id=self.id
+        ).order_by(CartItem.id).all()
+    
+    def touch(self):
+        """更新最後活動時間（供過期清理判斷）"""
+        self.updated_at = datetime.utcnow()
+    
+    def add_item(self, product_id, quantity, temperature='normal', ingredients=None):
+        """添加商品；相同配置（溫度與配料）的項目以單一 upsert 語句累加數量"""
+        self.touch()
+        ingredients = ingredients or []
+        values = {
+            'cart_id': self.id,
+            'product_id': product_id,
+            'quantity': quantity,
+            'temperature': temperature,
+            'ingredients': ingredients,
+            'signature': cart_item_signature(temperature, ingredients),
+            'created_at': datetime.utcnow()
+        }
+        
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(CartItem).values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['cart_id', 'product_id', 'signature'],
+                set_={'quantity': CartItem.quantity + stmt.excluded.quantity}
+            )
+        elif dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(CartItem).values(**values)
+            stmt = stmt.on_duplicate_key_update(
+                quantity=CartItem.quantity + stmt.inserted.quantity
+            )
+        else:
+            existing_item = CartItem.query.filter_by(
+                cart_id=self.id,
+                product_id=product_id,
+                signature=values['signature']
+            ).first()
+            if existing_item:
+                existing_item.quantity += quantity
+            else:
+                db.session.add(CartItem(**values))
+            return
+        
+        db.session.execute(stmt)
+    
+    def update_item(self, item_id, quantity):
+        """更新項目數量，數量小於等於 0 時移除；項目不存在時返回 False"""
+        # 以主鍵讀取：已由 load_items 載入的項目直接取自會話，批量操作不再逐個查詢
+        cart_item = db.session.get(CartItem, item_id) if self.id else None
+        if cart_item is None or cart_item.cart_id != self.id:
+            return False
+        self.touch()
+        if quantity <= 0:
+            db.session.delete(cart_item)
+        else:
+            cart_item.quantity = quantity
+        return True
+    
+    def remove_item(self, item_id):
+        """移除項目；項目不存在時返回 False"""
+        return self.update_item(item_id, 0)
+    
+    def batch(self):
+        """批量修改（資料庫購物車由外層交易保證原子性）"""
+        return nullcontext(self)
+    
     def clear(self):
         """清空購物車"""
         for item in self.cart_items:
@@ -68,40 +140,22 @@ class Cart(db.Model):
 class CartItem(db.Model):
     """購物車項目模型"""
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        db.UniqueConstraint('cart_id', 'product_id', 'signature', name='uq_cart_items_configuration'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False)
+    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     temperature = db.Column(db.Enum('cold', 'hot', 'normal'), default='normal')
     ingredients = db.Column(db.JSON)  # 存儲選擇的配料信息
+    signature = db.Column(db.String(40), nullable=False)  # 配置簽名，見 cart_item_signature
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def get_total_price(self):
         """獲取項目總價格"""
-        # 基礎價格
-        base_price = self.product.get_price(self.temperature)
-        total = base_price * self.quantity
-        
-        # 添加配料價格
-        if self.ingredients:
-            for ingredient in self.ingredients:
-                if isinstance(ingredient, dict):
-                    # 如果ingredient是字典，直接獲取price
-                    ingredient_price = float(ingredient.get('price', 0))
-                else:
-                    # 如果ingredient是ID，從product的ingredients中查找
-                    ingredient_id = ingredient
-                    ingredient_obj = None
-                    for prod_ingredient in self.product.ingredients:
-                        if prod_ingredient.id == ingredient_id:
-                            ingredient_obj = prod_ingredient
-                            break
-                    ingredient_price = float(ingredient_obj.price) if ingredient_obj else 0
-                
-                total += ingredient_price * self.quantity
-        
-        return total
+        return self.unit_price * self.quantity
     
     @property
     def line_total(self):
@@ -111,28 +165,13 @@ class CartItem(db.Model):
     @property
     def unit_price(self):
         """單價（含配料）"""
-        base_price = self.product.get_price(self.temperature)
-        ingredient_price = 0
-        if self.ingredients:
-            for ingredient in self.ingredients:
-                if isinstance(ingredient, dict):
-                    # 如果ingredient是字典，直接獲取price
-                    ingredient_price += float(ingredient.get('price', 0))
-                else:
-                    # 如果ingredient是ID，從product的ingredients中查找
-                    ingredient_id = ingredient
-                    ingredient_obj = None
-                    for prod_ingredient in self.product.ingredients:
-                        if prod_ingredient.id == ingredient_id:
-                            ingredient_obj = prod_ingredient
-                            break
-                    if ingredient_obj:
-                        ingredient_price += float(ingredient_obj.price)
-        return base_price + ingredient_price
+        from utils.pricing import get_unit_price
+        return get_unit_price(self.product_id, self.temperature, self.ingredients)
     
     def set_ingredients(self, ingredients_list):
-        """設置配料"""
+        """設置配料（同時更新配置簽名）"""
         self.ingredients = ingredients_list
+        self.signature = cart_item_signature(self.temperature, ingredients_list)
     
     def __repr__(self):
         return f'<CartItem {self.product.name} x{self.quantity}>'
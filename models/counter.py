@@ -0,0 +1,13 @@
+from database import db
+
+class DashboardCounter(db.Model):
+    """後台統計計數分片（隨資料寫入在同一交易中增減，讀取時按名稱加總，定期以 COUNT 校正）"""
+    __tablename__ = 'dashboard_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0, autoincrement=False)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime)  # 最後一次校正時間（只記錄在 shard 0）
+    
+    def __repr__(self):
+        return f'<DashboardCounter {self.name}[{self.shard}]={self.value}>'
@@ -0,0 +1,23 @@
+from datetime import datetime
+from database import db
+
+class IdempotencyKey(db.Model):
+    """冪等鍵記錄（保存首次請求的響應以供重放）"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'key', name='uq_idempotency_keys_scope_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(255), nullable=False)  # user:{id} 或 session:{session_id}
+    key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)  # 為空表示請求處理中
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)  # 處理租約起點
+    response_body = db.Column(db.Text)
+    response_mimetype = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.scope} {self.key}>'
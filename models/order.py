@@ -2,11 +2,31 @@ from datetime import datetime
 from decimal import Decimal
 from database import db
 import json
-import uuid
+
+ORDER_STATUSES = ('pending', 'confirmed', 'preparing', 'ready', 'completed', 'cancelled')
+
+# 訂單狀態機：目前狀態 -> 允許轉換的狀態（已完成、已取消為終態）
+ORDER_TRANSITIONS = {
+    'pending': ('confirmed', 'cancelled'),
+    'confirmed': ('preparing', 'cancelled'),
+    'preparing': ('ready', 'cancelled'),
+    'ready': ('completed',),
+    'completed': (),
+    'cancelled': ()
+}
 
 class Order(db.Model):
     """訂單模型"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        # 後台訂單列表的游標分頁與狀態篩選
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_created_at_id', 'status', 'created_at', 'id'),
+        # 顧客訂單歷史
+        db.Index('ix_orders_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+    
+    is_archived = False
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # 支持遊客訂單
@@ -15,8 +35,10 @@ class Order(db.Model):
     customer_phone = db.Column(db.String(20), nullable=False)
     customer_email = db.Column(db.String(255))
     total_amount = db.Column(db.Numeric(10, 2), nullable=False)
-    status = db.Column(db.Enum('pending', 'confirmed', 'preparing', 'ready', 'completed', 'cancelled'), 
-                      default='pending')
+    # active_history：修改時保留舊值，供統計計數判斷狀態變化
+    status = db.column_property(db.Column(db.Enum(*ORDER_STATUSES), default='pending'),
+                                active_history=True)
+    version = db.Column(db.Integer, nullable=False, default=1)  # 樂觀鎖版本號
     payment_method = db.Column(db.String(50))
     payment_status = db.Column(db.String(50), default='pending')
     notes = db.Column(db.Text)
@@ -26,14 +48,26 @@ class Order(db.Model):
     # 關聯關係
     order_items = db.relationship('OrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
     
+    __mapper_args__ = {'version_id_col': version}
+    
     def __init__(self, **kwargs):
         super(Order, self).__init__(**kwargs)
         if not self.order_number:
             self.order_number = self.generate_order_number()
     
     def generate_order_number(self):
-        """生成訂單號"""
-        return f"ORD-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+        """生成訂單號（由已配置的訂單號生成器產生）"""
+        from utils.order_numbers import next_order_number
+        return next_order_number()
+    
+    @staticmethod
+    def sources_for(status):
+        """可轉換至指定狀態的來源狀態"""
+        return tuple(source for source, targets in ORDER_TRANSITIONS.items() if status in targets)
+    
+    def can_transition_to(self, status):
+        """是否允許轉換至指定狀態"""
+        return status in ORDER_TRANSITIONS.get(self.status, ())
     
     def calculate_total(self):
         """計算訂單總金額"""
@@ -51,10 +85,11 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     product_name = db.Column(db.String(255), nullable=False)  # 產品名稱快照
     product_price = db.Column(db.Numeric(10, 2), nullable=False)  # 產品價格快照
+    product_image = db.Column(db.String(255))  # 產品縮圖快照（下單時的第一張啟用圖片）
     quantity = db.Column(db.Integer, nullable=False)
     line_total = db.Column(db.Numeric(10, 2), nullable=False)
     temperature = db.Column(db.Enum('cold', 'hot', 'normal'), default='normal')
@@ -82,3 +117,36 @@ class OrderItem(db.Model):
     
     def __repr__(self):
         return f'<OrderItem {self.product_name} x{self.quantity}>'
+
+class OrderSequence(db.Model):
+    """每日訂單流水號（各 worker 以區塊方式預留）"""
+    __tablename__ = 'order_sequences'
+    
+    day = db.Column(db.String(8), primary_key=True)  # YYYYMMDD
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+    
+    def __repr__(self):
+        return f'<OrderSequence {self.day} next={self.next_value}>'
+
+class OrderEvent(db.Model):
+    """訂單狀態事件（與狀態更新同一交易寫入，供即時推送與斷線補發）"""
+    __tablename__ = 'order_events'
+    
+    id = db.Column(db.Integer, primary_key=True)  # 事件游標（SSE 事件 ID）
+    order_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, index=True)
+    status = db.Column(db.Enum(*ORDER_STATUSES), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'user_id': self.user_id,
+            'status': self.status,
+            'version': self.version
+        }
+    
+    def __repr__(self):
+        return f'<OrderEvent {self.order_id} {self.status}>'
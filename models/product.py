@@ -2,6 +2,9 @@ from datetime import datetime
 from decimal import Decimal
 from database import db
 
+# 圖片處理狀態
+IMAGE_STATUSES = ('pending', 'ready', 'failed')
+
 class Product(db.Model):
     """產品模型"""
     __tablename__ = 'products'
@@ -47,6 +50,8 @@ class ProductImage(db.Model):
     image = db.Column(db.String(500), nullable=False)
     sort = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
+    # 處理狀態：pending 時 image 為原圖且 is_active 為 False，轉換完成後為 ready
+    status = db.Column(db.Enum(*IMAGE_STATUSES), nullable=False, default='ready', server_default='ready')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -65,3 +70,15 @@ class ProductIngredient(db.Model):
     
     def __repr__(self):
         return f'<ProductIngredient {self.name}>'
+
+class ProductChange(db.Model):
+    """產品變更日誌（供客戶端增量同步）"""
+    __tablename__ = 'product_changes'
+    
+    id = db.Column(db.Integer, primary_key=True)  # 同步游標
+    product_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.Enum('upsert', 'remove'), nullable=False)  # remove 即下架墓碑
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ProductChange {self.product_id} {self.action}>'
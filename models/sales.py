@@ -0,0 +1,32 @@
+from database import db
+
+class SalesRollupBase(db.Model):
+    """銷售彙總（依訂單建立時間分桶、依目前訂單狀態分組，隨下單與狀態轉換增量維護）
+
+    每個 (分桶, 狀態) 分散為多個分片行，並發下單寫入不同行，讀取時加總。
+    """
+    __abstract__ = True
+    
+    status = db.Column(db.String(20), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0, autoincrement=False)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    items_sold = db.Column(db.Integer, nullable=False, default=0)
+
+class SalesHourly(SalesRollupBase):
+    """每小時銷售彙總"""
+    __tablename__ = 'sales_hourly'
+    
+    bucket = db.Column(db.DateTime, primary_key=True)  # 整點（UTC）
+    
+    def __repr__(self):
+        return f'<SalesHourly {self.bucket} {self.status}>'
+
+class SalesDaily(SalesRollupBase):
+    """每日銷售彙總"""
+    __tablename__ = 'sales_daily'
+    
+    bucket = db.Column(db.Date, primary_key=True)  # 日期（UTC）
+    
+    def __repr__(self):
+        return f'<SalesDaily {self.bucket} {self.status}>'
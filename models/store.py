@@ -1,5 +1,6 @@
 from datetime import datetime
 from database import db
+from .product import IMAGE_STATUSES
 
 # Store 和 Product 的多對多關聯表
 store_products = db.Table('store_products',
@@ -37,6 +38,8 @@ class StoreImage(db.Model):
     image = db.Column(db.String(500), nullable=False)
     sort = db.Column(db.Integer, default=0)
     is_active = db.Column(db.Boolean, default=True)
+    # 處理狀態（同 ProductImage.status）
+    status = db.Column(db.Enum(*IMAGE_STATUSES), nullable=False, default='ready', server_default='ready')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
@@ -1,51 +1,158 @@
-from flask import Blueprint, request, jsonify, session
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from flask import Blueprint, request, jsonify, current_app, abort
 from flask_login import login_required, current_user
+from app.schemas.base import ChartResponse, XYPoint
 from database import db
-from models import Product, ProductImage, Cart, CartItem, Order, OrderItem, User
+from models import Product, ProductImage, User
+from models.order import ORDER_STATUSES
+from utils.cart_pricing import price_cart
+from utils.cart_store import find_cart, get_or_create_cart
+from utils.checkout import checkout_cart
+from utils.idempotency import idempotent
+from utils.order_status import CONFLICT, INVALID, NOT_FOUND, transition_order, transition_orders
+from utils.pricing import resolve_ingredients
+from utils.sales_rollups import bucket_label, sales_series
+from utils.http_cache import make_etag, not_modified, with_etag
+from utils.menu_cache import (
+    get_menu_snapshot,
+    current_version as current_menu_version,
+    get_product_changes as product_changes_since,
+    product_changes_window
+)
 
 api_bp = Blueprint('api', __name__)
 
+# 列表投影可選欄位
+PRODUCT_FIELDS = ('id', 'name', 'price', 'special_price', 'cold_price', 'hot_price',
+                  'effective_price', 'description', 'image')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BATCH_OPERATIONS = 100
+TRANSITION_ERROR_CODES = {CONFLICT: 409, INVALID: 422}
+
+# 銷售圖表：路徑指標 -> 彙總欄位；時間粒度 -> (步長, 預設資料點數)
+CHART_METRICS = {'revenue': 'revenue', 'orders': 'order_count', 'items': 'items_sold'}
+CHART_WINDOWS = {'hour': (timedelta(hours=1), 48), 'day': (timedelta(days=1), 30)}
+MAX_CHART_POINTS = 1000
+
+def _is_int(value):
+    """JSON 中的整數（排除布林值）"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _parse_version(value):
+    """解析客戶端提交的期望版本號"""
+    return int(value) if value not in (None, '') else None
+
+def _product_field_column(field):
+    """將投影欄位轉換為查詢欄位"""
+    if field == 'effective_price':
+        return db.case((Product.special_price > 0, Product.special_price),
+                       else_=Product.price).label(field)
+    if field == 'image':
+        # 第一張啟用圖片（依排序）
+        return db.select(ProductImage.image).where(
+            ProductImage.product_id == Product.id,
+            ProductImage.is_active.is_(True)
+        ).order_by(ProductImage.sort, ProductImage.id).limit(1).scalar_subquery().label(field)
+    return getattr(Product, field)
+
+def _paginated_products():
+    """以 Product.id 為游標分頁，並只查詢所需欄位"""
+    after = request.args.get('after', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    fields_arg = request.args.get('fields')
+    fields = [f.strip() for f in fields_arg.split(',') if f.strip()] if fields_arg else list(PRODUCT_FIELDS)
+    unknown = [f for f in fields if f not in PRODUCT_FIELDS]
+    if unknown:
+        return jsonify({'error': '不支援的欄位: ' + ', '.join(unknown)}), 400
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    etag = make_etag('products-page', after, limit, ','.join(fields), current_menu_version())
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    # 多取一筆以判斷是否還有下一頁
+    rows = db.session.execute(
+        db.select(*[_product_field_column(f) for f in fields])
+        .where(Product.is_active.is_(True), Product.id > after)
+        .order_by(Product.id)
+        .limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = []
+    for row in rows:
+        item = row._asdict()
+        for key, value in item.items():
+            if isinstance(value, Decimal):
+                item[key] = float(value)
+        items.append(item)
+
+    response = jsonify({
+        'items': items,
+        'next_cursor': items[-1]['id'] if has_more else None
+    })
+    return with_etag(response, etag)
+
 @api_bp.route('/products')
 def get_products():
-    """獲取產品列表"""
-    from sqlalchemy.orm import joinedload
-    products = Product.query.options(
-        joinedload(Product.images)
-    ).filter_by(is_active=True).all()
-    return jsonify([{
-        'id': p.id,
-        'name': p.name,
-        'price': float(p.price),
-        'special_price': float(p.special_price),
-        'cold_price': float(p.cold_price),
-        'hot_price': float(p.hot_price),
-        'description': p.description,
-        'images': [img.image for img in p.images if img.is_active]
-    } for p in products])
+    """獲取產品列表（帶 after/limit/fields 參數時分頁並投影）"""
+    if any(key in request.args for key in ('after', 'limit', 'fields')):
+        return _paginated_products()
+
+    etag = make_etag('products', current_menu_version())
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    snapshot = get_menu_snapshot()
+    response = current_app.response_class(snapshot.products_json, mimetype='application/json')
+    return with_etag(response, make_etag('products', snapshot.version))
+
+@api_bp.route('/products/changes')
+def get_product_changes():
+    """獲取游標之後的產品變更（增量同步）"""
+    since = request.args.get('since', 0, type=int)
+    if since < 0:
+        return jsonify({'error': '無效的游標'}), 400
+
+    # 可發布的游標隨寬限期推進而不改變菜單版本，需納入 ETag
+    window = product_changes_window()
+    etag = make_etag('changes', since, *window)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    cursor, updated, removed, resync = product_changes_since(since, window)
+    # resync 為 true 時 updated 為全部上架產品，客戶端應替換本地資料
+    response = jsonify({
+        'cursor': cursor,
+        'resync': resync,
+        'updated': updated,
+        'removed': removed
+    })
+    return with_etag(response, etag)
 
 @api_bp.route('/products/<int:product_id>')
 def get_product(product_id):
     """獲取產品詳情"""
-    from sqlalchemy.orm import joinedload
-    product = Product.query.options(
-        joinedload(Product.images),
-        joinedload(Product.ingredients)
-    ).filter_by(id=product_id, is_active=True).first_or_404()
-    return jsonify({
-        'id': product.id,
-        'name': product.name,
-        'price': float(product.price),
-        'special_price': float(product.special_price),
-        'cold_price': float(product.cold_price),
-        'hot_price': float(product.hot_price),
-        'description': product.description,
-        'images': [img.image for img in product.images if img.is_active],
-        'ingredients': [{
-            'id': ing.id,
-            'name': ing.name,
-            'price': float(ing.price)
-        } for ing in product.ingredients if ing.is_active]
-    })
+    etag = make_etag('product', product_id, current_menu_version())
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    snapshot = get_menu_snapshot()
+    body = snapshot.details_json.get(product_id)
+    if body is None:
+        abort(404)
+    response = current_app.response_class(body, mimetype='application/json')
+    return with_etag(response, make_etag('product', product_id, snapshot.version))
 
 @api_bp.route('/cart/add', methods=['POST'])
 def add_to_cart():
@@ -59,26 +166,11 @@ def add_to_cart():
     product = Product.query.get_or_404(product_id)
     cart = get_or_create_cart()
     
-        # 檢查是否已存在相同配置的商品
-    existing_item = CartItem.query.filter_by(
-        cart_id=cart.id,
-        product_id=product_id,
-        temperature=temperature
-    ).first()
-    
-    if existing_item:
-        existing_item.quantity += quantity
-        existing_item.set_ingredients(ingredients)
-    else:
-        cart_item = CartItem(
-            cart_id=cart.id,
-            product_id=product_id,
-            quantity=quantity,
-            temperature=temperature
-        )
-        cart_item.set_ingredients(ingredients)
-        db.session.add(cart_item)
+    # 加入時即解析配料名稱與價格，結算時無需再查詢
+    ingredients = resolve_ingredients(product.id, ingredients)
     
+    # 相同配置的商品合併數量
+    cart.add_item(product.id, quantity, temperature, ingredients)
     db.session.commit()
     
     return jsonify({'status': 'success', 'message': '已添加到購物車'})
@@ -90,12 +182,8 @@ def update_cart_item():
     item_id = data.get('item_id')
     quantity = data.get('quantity')
     
-    cart_item = CartItem.query.get_or_404(item_id)
-    cart_item.quantity = quantity
-    
-    if quantity <= 0:
-        db.session.delete(cart_item)
-    
+    if not find_cart().update_item(item_id, quantity):
+        abort(404)
     db.session.commit()
     
     return jsonify({'status': 'success', 'message': '購物車已更新'})
@@ -106,50 +194,108 @@ def remove_from_cart():
     data = request.get_json()
     item_id = data.get('item_id')
     
-    cart_item = CartItem.query.get_or_404(item_id)
-    db.session.delete(cart_item)
+    if not find_cart().remove_item(item_id):
+        abort(404)
     db.session.commit()
     
     return jsonify({'status': 'success', 'message': '已從購物車移除'})
 
-@api_bp.route('/cart')
-def get_cart():
-    """獲取購物車內容"""
+@api_bp.route('/cart/batch', methods=['POST'])
+def batch_update_cart():
+    """批量修改購物車（add / update / remove），於單一交易中完成"""
+    data = request.get_json() or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'status': 'error', 'message': '缺少操作列表'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'status': 'error', 'message': f'單次最多 {MAX_BATCH_OPERATIONS} 個操作'}), 400
+    
+    # 批量載入商品
+    product_ids = {op.get('product_id') for op in operations
+                   if isinstance(op, dict) and op.get('op') == 'add' and _is_int(op.get('product_id'))}
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids))} if product_ids else {}
+    
+    # 一次載入項目；保留引用，後續修改直接使用會話中的項目
     cart = get_or_create_cart()
+    items = {item.id: item for item in cart.load_items(with_images=False)}
+    
+    # 先驗證全部操作，任何一個無效則整批不執行
+    for index, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind == 'add':
+            quantity = op.get('quantity', 1)
+            valid = _is_int(op.get('product_id')) and op['product_id'] in products \
+                and _is_int(quantity) and quantity > 0
+        elif kind == 'update':
+            valid = _is_int(op.get('item_id')) and op['item_id'] in items and _is_int(op.get('quantity'))
+        elif kind == 'remove':
+            valid = _is_int(op.get('item_id')) and op['item_id'] in items
+        else:
+            valid = False
+        if not valid:
+            db.session.rollback()
+            return jsonify({'status': 'error', 'message': f'第 {index + 1} 個操作無效', 'index': index}), 400
+    
+    with cart.batch():
+        for op in operations:
+            if op['op'] == 'add':
+                product_id = op['product_id']
+                cart.add_item(
+                    product_id,
+                    op.get('quantity', 1),
+                    op.get('temperature', 'normal'),
+                    resolve_ingredients(product_id, op.get('ingredients', []))
+                )
+            elif op['op'] == 'update':
+                cart.update_item(op['item_id'], op['quantity'])
+            else:
+                cart.remove_item(op['item_id'])
+    db.session.commit()
+    
+    response = _serialize_cart(price_cart(cart))
+    response['status'] = 'success'
+    return jsonify(response)
+
+def _serialize_cart(priced):
+    """將已計價的購物車序列化為 API 格式"""
     items = []
     
-    for item in cart.cart_items:
+    for line in priced.lines:
         items.append({
-            'id': item.id,
+            'id': line.id,
             'product': {
-                'id': item.product.id,
-                'name': item.product.name,
-                'price': item.product.get_price(item.temperature)
+                'id': line.product.id,
+                'name': line.product.name,
+                'price': line.base_price
             },
-            'quantity': item.quantity,
-            'temperature': item.temperature,
-            'ingredients': item.ingredients or [],
-            'total_price': item.get_total_price()
+            'quantity': line.quantity,
+            'temperature': line.temperature,
+            'ingredients': line.ingredients,
+            'total_price': line.line_total
         })
     
-    return jsonify({
+    return {
         'items': items,
-        'total_items': cart.get_total_items(),
-        'total_amount': cart.get_total_amount()
-    })
+        'total_items': priced.total_items,
+        'total_amount': priced.total_amount
+    }
+
+@api_bp.route('/cart')
+def get_cart():
+    """獲取購物車內容"""
+    return jsonify(_serialize_cart(price_cart(find_cart())))
 
 @api_bp.route('/orders', methods=['POST'])
 @login_required
+@idempotent
 def create_order():
     """創建訂單"""
-    data = request.get_json()
-    cart = get_or_create_cart()
-    
-    if cart.cart_items.count() == 0:
-        return jsonify({'error': '購物車為空'}), 400
+    data = request.get_json(silent=True) or {}
+    if not data.get('customer_name') or not data.get('customer_phone'):
+        return jsonify({'error': '請填寫姓名和手機號'}), 400
     
-    # 創建訂單
-    order = Order(
+    order = checkout_cart(
+        find_cart(),
         user_id=current_user.id,
         customer_name=data.get('customer_name'),
         customer_phone=data.get('customer_phone'),
@@ -157,59 +303,11 @@ def create_order():
         payment_method=data.get('payment_method', 'cash'),
         notes=data.get('notes', '')
     )
-    
-    db.session.add(order)
-    db.session.flush()  # 獲取訂單ID
-    
-    # 創建訂單項目
-    total_amount = 0
-    for cart_item in cart.cart_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=cart_item.product_id,
-            product_name=cart_item.product.name,
-            product_price=cart_item.product.get_price(cart_item.temperature),
-            quantity=cart_item.quantity,
-            temperature=cart_item.temperature,
-            ingredients=cart_item.ingredients
-        )
-        order_item.calculate_line_total()
-        total_amount += float(order_item.line_total)
-        
-        db.session.add(order_item)
-    
-    order.total_amount = total_amount
-    db.session.commit()
-    
-    # 清空購物車
-    cart.clear()
+    if order is None:
+        return jsonify({'error': '購物車為空'}), 400
     
     return jsonify({'success': True, 'order_id': order.id, 'order_number': order.order_number})
 
-def get_or_create_cart():
-    """獲取或創建購物車"""
-    if current_user.is_authenticated:
-        cart = Cart.query.filter_by(user_id=current_user.id).first()
-        if not cart:
-            cart = Cart(user_id=current_user.id)
-            db.session.add(cart)
-            db.session.commit()
-    else:
-        # 遊客購物車
-        session_id = session.get('session_id')
-        if not session_id:
-            import uuid
-            session_id = str(uuid.uuid4())
-            session['session_id'] = session_id
-        
-        cart = Cart.query.filter_by(session_id=session_id).first()
-        if not cart:
-            cart = Cart(session_id=session_id)
-            db.session.add(cart)
-            db.session.commit()
-    
-    return cart
-
 # 管理員 API
 @api_bp.route('/admin/products/images/<int:image_id>/delete', methods=['POST'])
 @login_required
@@ -300,11 +398,126 @@ def update_order_status(order_id):
     if not current_user.is_admin:
         return jsonify({'status': 'error', 'message': '無權限'}), 403
     
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     new_status = data.get('status')
+    if new_status not in ORDER_STATUSES:
+        return jsonify({'status': 'error', 'message': '無效的訂單狀態'}), 400
+    try:
+        version = _parse_version(data.get('version'))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': '無效的版本號'}), 400
+    
+    result = transition_order(order_id, new_status, version)
+    db.session.commit()
     
-    order = Order.query.get_or_404(order_id)
-    order.status = new_status
+    if result.outcome == NOT_FOUND:
+        abort(404)
+    if not result.ok:
+        message = '訂單已被其他人更新，請重新整理' if result.outcome == CONFLICT else '不允許的狀態轉換'
+        return jsonify({'status': 'error', 'message': message, 'order_status': result.status,
+                        'version': result.version}), TRANSITION_ERROR_CODES[result.outcome]
+    return jsonify({'status': 'success', 'order_status': result.status, 'version': result.version})
+
+@api_bp.route('/admin/orders/status', methods=['POST'])
+@login_required
+def bulk_update_order_status():
+    """批量轉換訂單狀態（逐筆以版本號判斷，失敗的訂單不影響其他訂單）"""
+    if not current_user.is_admin:
+        return jsonify({'status': 'error', 'message': '無權限'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    new_status = data.get('status')
+    orders = data.get('orders')
+    if new_status not in ORDER_STATUSES:
+        return jsonify({'status': 'error', 'message': '無效的訂單狀態'}), 400
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'status': 'error', 'message': '缺少訂單列表'}), 400
+    if len(orders) > MAX_BATCH_OPERATIONS:
+        return jsonify({'status': 'error', 'message': f'單次最多 {MAX_BATCH_OPERATIONS} 筆訂單'}), 400
+    
+    # 每筆可為訂單ID，或 {"id": 訂單ID, "version": 期望版本號}
+    targets = []
+    for index, entry in enumerate(orders):
+        try:
+            if isinstance(entry, dict):
+                targets.append((int(entry['id']), _parse_version(entry.get('version'))))
+            else:
+                targets.append((int(entry), None))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': f'第 {index + 1} 筆訂單無效', 'index': index}), 400
+    
+    results = transition_orders(targets, new_status)
     db.session.commit()
     
-    return jsonify({'status': 'success', 'order_status': order.status})
\ No newline at end of file
+    return jsonify({
+        'status': 'success',
+        'updated': [result.to_dict() for result in results if result.ok],
+        'failed': [result.to_dict() for result in results if not result.ok]
+    })
+
+@api_bp.route('/admin/analytics/sales/<metric>')
+@login_required
+def sales_chart(metric):
+    """銷售圖表（讀取每小時 / 每日彙總，不掃描訂單表）"""
+    if not current_user.is_admin:
+        return jsonify({'status': 'error', 'message': '無權限'}), 403
+    if metric not in CHART_METRICS:
+        abort(404)
+    
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in CHART_WINDOWS:
+        return jsonify({'status': 'error', 'message': '無效的時間粒度'}), 400
+    
+    statuses = request.args.get('status')
+    statuses = [s.strip() for s in statuses.split(',') if s.strip()] if statuses else \
+        [s for s in ORDER_STATUSES if s != 'cancelled']
+    if any(s not in ORDER_STATUSES for s in statuses):
+        return jsonify({'status': 'error', 'message': '無效的訂單狀態'}), 400
+    
+    # 預設為最近的時間窗口；end 為不含的上界
+    step, default_points = CHART_WINDOWS[granularity]
+    try:
+        end = _parse_chart_time(request.args.get('end')) or datetime.utcnow() + step
+        start = _parse_chart_time(request.args.get('start')) or end - step * default_points
+    except ValueError:
+        return jsonify({'status': 'error', 'message': '無效的時間範圍'}), 400
+    if start >= end or (end - start) / step > MAX_CHART_POINTS:
+        return jsonify({'status': 'error', 'message': f'時間範圍最多 {MAX_CHART_POINTS} 個資料點'}), 400
+    
+    series = sales_series(granularity, CHART_METRICS[metric], start, end, statuses)
+    chart = ChartResponse(status='success', data=[
+        XYPoint(x=bucket_label(bucket), y=value) for bucket, value in series
+    ])
+    return current_app.response_class(chart.model_dump_json(), mimetype='application/json')
+
+@api_bp.route('/admin/analytics/popularity')
+@login_required
+def popularity():
+    """熱銷商品、溫度分佈與配料附加率"""
+    if not current_user.is_admin:
+        return jsonify({'status': 'error', 'message': '無權限'}), 403
+    
+    statuses = request.args.get('status')
+    statuses = [s.strip() for s in statuses.split(',') if s.strip()] if statuses else \
+        [s for s in ORDER_STATUSES if s != 'cancelled']
+    if any(s not in ORDER_STATUSES for s in statuses):
+        return jsonify({'status': 'error', 'message': '無效的訂單狀態'}), 400
+    try:
+        start = _parse_chart_time(request.args.get('start'))
+        end = _parse_chart_time(request.args.get('end'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': '無效的時間範圍'}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    
+    # 分析模組依賴 NumPy，僅在使用時載入
+    from utils.popularity import popularity_report
+    return jsonify({'status': 'success', 'data': popularity_report(start, end, statuses, limit)})
+
+def _parse_chart_time(value):
+    """解析 YYYY-MM-DD 或 ISO 時間；帶時區的時間轉為 UTC（資料庫以無時區 UTC 保存）"""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
@@ -1,7 +1,16 @@
-﻿from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+﻿from datetime import datetime, timedelta
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, \
+    Response, stream_with_context
 from flask_login import login_required, current_user
 from database import db
 from models import User, Product, ProductImage, ProductIngredient, Order, Store, StoreImage
+from models.order import ORDER_STATUSES
+from utils.counters import get_counters
+from utils.order_archive import find_order
+from utils.order_events import order_event_stream
+from utils.order_export import EXPORT_FORMATS, export_orders as order_export_stream
+from utils.order_queries import load_order_items, load_product_thumbnails, paginate_orders
+from utils.order_status import CONFLICT, NOT_FOUND, transition_order
 
 backend_bp = Blueprint('backend', __name__)
 
@@ -17,20 +26,17 @@ def require_admin():
 @backend_bp.route('/')
 def dashboard():
     
-    #   ?   
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    total_users = User.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
+    # 統計數據（預先計算的計數，單次查詢）
+    counters = get_counters()
     
     # ?   ???
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
+    recent_orders = Order.query.order_by(Order.created_at.desc(), Order.id.desc()).limit(10).all()
     
     return render_template('backend/dashboard.html', 
-                         total_products=total_products,
-                         total_orders=total_orders,
-                         total_users=total_users,
-                         pending_orders=pending_orders,
+                         total_products=counters['products'],
+                         total_orders=counters['orders'],
+                         total_users=counters['users'],
+                         pending_orders=counters['pending_orders'],
                          recent_orders=recent_orders)
 
 @backend_bp.route('/products')
@@ -68,22 +74,18 @@ def create_product():
         db.session.add(product)
         db.session.commit()
         
-        # 處理圖片上傳
-        from utils.image_utils import save_product_image
+        # 處理圖片上傳（保存原圖，轉換 WebP 交給圖片處理管線）
+        from utils.image_pipeline import add_pending_image, enqueue_images
         images = request.files.getlist('images')
         if images:
+            pending_images = []
             for idx, image_file in enumerate(images):
                 if image_file and image_file.filename:
-                    image_path = save_product_image(image_file, product.id)
-                    if image_path:
-                        product_image = ProductImage(
-                            product_id=product.id,
-                            image=image_path,
-                            sort=idx,
-                            is_active=True
-                        )
-                        db.session.add(product_image)
+                    product_image = add_pending_image('product', product.id, image_file, idx)
+                    if product_image:
+                        pending_images.append(product_image)
             db.session.commit()
+            enqueue_images(pending_images)
         
         flash('商品創建成功', 'success')
         return redirect(url_for('backend.products'))
@@ -109,26 +111,22 @@ def edit_product(product_id):
         product.description = request.form.get('description')
         product.is_active = bool(request.form.get('is_active'))
         
-        # 處理新上傳的圖片
-        from utils.image_utils import save_product_image
+        # 處理新上傳的圖片（保存原圖，轉換 WebP 交給圖片處理管線）
+        from utils.image_pipeline import add_pending_image, enqueue_images
         images = request.files.getlist('images')
+        pending_images = []
         if images:
             # 獲取當前最大排序號
             max_sort = db.session.query(db.func.max(ProductImage.sort)).filter_by(product_id=product.id).scalar() or 0
             
             for idx, image_file in enumerate(images):
                 if image_file and image_file.filename:
-                    image_path = save_product_image(image_file, product.id)
-                    if image_path:
-                        product_image = ProductImage(
-                            product_id=product.id,
-                            image=image_path,
-                            sort=max_sort + idx + 1,
-                            is_active=True
-                        )
-                        db.session.add(product_image)
+                    product_image = add_pending_image('product', product.id, image_file, max_sort + idx + 1)
+                    if product_image:
+                        pending_images.append(product_image)
         
         db.session.commit()
+        enqueue_images(pending_images)
         
         flash('商品更新成功', 'success')
         return redirect(url_for('backend.products'))
@@ -147,25 +145,92 @@ def delete_product(product_id):
 
 @backend_bp.route('/orders')
 def orders():
+    """訂單列表（游標分頁，可依狀態與日期篩選）"""
+    status, start, end, filters = _order_filters()
     
-    orders = Order.query.order_by(Order.created_at.desc()).all()
-    return render_template('backend/orders.html', orders=orders)
+    query = Order.query
+    if status:
+        query = query.filter(Order.status == status)
+    if start:
+        query = query.filter(Order.created_at >= start)
+    if end:
+        query = query.filter(Order.created_at < end)
+    
+    orders, next_cursor = paginate_orders(query, request.args.get('before'))
+    return render_template('backend/orders.html', orders=orders,
+                           order_items=load_order_items(orders),
+                           next_cursor=next_cursor, filters=filters,
+                           is_first_page=not request.args.get('before'))
+
+@backend_bp.route('/orders/export')
+def export_orders():
+    """串流匯出訂單（CSV / JSONL），篩選條件與訂單列表相同"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    status, start, end, filters = _order_filters()
+    
+    chunks = order_export_stream(fmt, start, end, [status] if status else None)
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt])
+    filename = '-'.join(['orders', *(value for value in filters.values() if value)])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    return response
+
+def _order_filters():
+    """解析訂單篩選參數，返回 (狀態, 開始時間, 結束時間（不含）, 模板用篩選值)"""
+    status = request.args.get('status')
+    status = status if status in ORDER_STATUSES else None
+    date_from = _parse_date(request.args.get('date_from'))
+    date_to = _parse_date(request.args.get('date_to'))
+    filters = {
+        'status': status,
+        'date_from': date_from.strftime('%Y-%m-%d') if date_from else None,
+        'date_to': date_to.strftime('%Y-%m-%d') if date_to else None
+    }
+    return status, date_from, date_to + timedelta(days=1) if date_to else None, filters
+
+def _parse_date(value):
+    """解析 YYYY-MM-DD 日期，無效時返回 None"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
+@backend_bp.route('/orders/stream')
+def orders_stream():
+    """廚房即時訂單推送（SSE，所有訂單）"""
+    return order_event_stream()
 
 @backend_bp.route('/orders/<int:order_id>')
 def order_detail(order_id):
     
-    order = Order.query.get_or_404(order_id)
-    return render_template('backend/order_detail.html', order=order)
+    # 線上表找不到時查詢歸檔表
+    order = find_order(order_id)
+    if order is None:
+        abort(404)
+    order_items = load_order_items([order])[order.id]
+    thumbnails = load_product_thumbnails(
+        item.product_id for item in order_items if not item.product_image
+    )
+    return render_template('backend/order_detail.html', order=order,
+                           order_items=order_items, thumbnails=thumbnails)
 
 @backend_bp.route('/orders/<int:order_id>/status', methods=['POST'])
 def update_order_status(order_id):
-    order = Order.query.get_or_404(order_id)
     new_status = request.form.get('status')
+    version = request.form.get('version', type=int)
     
-    if new_status in ['pending', 'confirmed', 'preparing', 'ready', 'completed', 'cancelled']:
-        order.status = new_status
+    if new_status in ORDER_STATUSES:
+        result = transition_order(order_id, new_status, version)
         db.session.commit()
-        flash('Operation completed', 'success')
+        if result.outcome == NOT_FOUND:
+            abort(404)
+        if result.ok:
+            flash('Operation completed', 'success')
+        elif result.outcome == CONFLICT:
+            flash('Order was updated by someone else, please retry', 'error')
+        else:
+            flash('Operation failed', 'error')
     else:
         flash('Operation failed', 'error')
     
@@ -275,23 +340,19 @@ def create_store():
             if product:
                 store.products.append(product)
         
-        # 處理店鋪圖片上傳
-        from utils.image_utils import save_store_image
+        # 處理店鋪圖片上傳（保存原圖，轉換 WebP 交給圖片處理管線）
+        from utils.image_pipeline import add_pending_image, enqueue_images
         images = request.files.getlist('images')
+        pending_images = []
         if images:
             for idx, image_file in enumerate(images):
                 if image_file and image_file.filename:
-                    image_path = save_store_image(image_file, store.id)
-                    if image_path:
-                        store_image = StoreImage(
-                            store_id=store.id,
-                            image=image_path,
-                            sort=idx,
-                            is_active=True
-                        )
-                        db.session.add(store_image)
+                    store_image = add_pending_image('store', store.id, image_file, idx)
+                    if store_image:
+                        pending_images.append(store_image)
         
         db.session.commit()
+        enqueue_images(pending_images)
 
         flash('店鋪創建成功', 'success')
         return redirect(url_for('backend.stores'))
@@ -331,26 +392,22 @@ def edit_store(store_id):
             if product:
                 store.products.append(product)
 
-        # 處理新上傳的店鋪圖片
-        from utils.image_utils import save_store_image
+        # 處理新上傳的店鋪圖片（保存原圖，轉換 WebP 交給圖片處理管線）
+        from utils.image_pipeline import add_pending_image, enqueue_images
         images = request.files.getlist('images')
+        pending_images = []
         if images:
             # 獲取當前最大排序號
             max_sort = db.session.query(db.func.max(StoreImage.sort)).filter_by(store_id=store.id).scalar() or 0
             
             for idx, image_file in enumerate(images):
                 if image_file and image_file.filename:
-                    image_path = save_store_image(image_file, store.id)
-                    if image_path:
-                        store_image = StoreImage(
-                            store_id=store.id,
-                            image=image_path,
-                            sort=max_sort + idx + 1,
-                            is_active=True
-                        )
-                        db.session.add(store_image)
+                    store_image = add_pending_image('store', store.id, image_file, max_sort + idx + 1)
+                    if store_image:
+                        pending_images.append(store_image)
 
         db.session.commit()
+        enqueue_images(pending_images)
 
         flash('店鋪更新成功', 'success')
         return redirect(url_for('backend.stores'))
@@ -1,21 +1,38 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+import uuid
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
 from flask_login import login_required, current_user, login_user, logout_user
 from database import db
-from models import User, Product, Cart, CartItem, Order, OrderItem, Store
+from models import User, Product, Store
+from utils.cart_pricing import price_cart
+from utils.cart_store import find_cart
+from utils.checkout import checkout_cart
+from utils.idempotency import idempotent
+from utils.order_events import order_event_stream
+from utils.order_queries import load_order_items, load_product_thumbnails, paginate_user_orders
+from utils.http_cache import page_etag, not_modified, with_etag
+from utils.menu_cache import current_version as current_menu_version
 
 frontend_bp = Blueprint('frontend', __name__)
 
+ORDER_HISTORY_PAGE_SIZE = 10
+
 @frontend_bp.route('/')
 def index():
     """首頁"""
     from sqlalchemy.orm import joinedload
 
+    etag = page_etag('index', current_menu_version())
+    cached = not_modified(etag, private=True)
+    if cached is not None:
+        return cached
+
     stores = Store.query.options(
         joinedload(Store.products).joinedload(Product.images),
         joinedload(Store.images)
     ).filter_by(is_active=True).order_by(Store.name).all()
 
-    return render_template('frontend/index.html', stores=stores)
+    response = make_response(render_template('frontend/index.html', stores=stores))
+    return with_etag(response, etag, private=True)
 
 
 @frontend_bp.route('/store/<int:store_id>')
@@ -23,12 +40,18 @@ def store_detail(store_id):
     """門市詳情"""
     from sqlalchemy.orm import joinedload
 
+    etag = page_etag('store', store_id, current_menu_version())
+    cached = not_modified(etag, private=True)
+    if cached is not None:
+        return cached
+
     store = Store.query.options(
         joinedload(Store.images),
         joinedload(Store.products).joinedload(Product.images)
     ).filter_by(id=store_id, is_active=True).first_or_404()
 
-    return render_template('frontend/store_detail.html', store=store)
+    response = make_response(render_template('frontend/store_detail.html', store=store))
+    return with_etag(response, etag, private=True)
 
 @frontend_bp.route('/product/<int:product_id>')
 def product_detail(product_id):
@@ -43,18 +66,19 @@ def product_detail(product_id):
 @frontend_bp.route('/cart')
 def cart():
     """購物車頁面"""
-    cart = get_or_create_cart()
-    return render_template('frontend/cart.html', cart=cart)
+    priced = price_cart(find_cart())
+    return render_template('frontend/cart.html', cart=priced)
 
 @frontend_bp.route('/checkout')
 @login_required
 def checkout():
     """結算頁面"""
-    cart = get_or_create_cart()
-    if cart.cart_items.count() == 0:
+    priced = price_cart(find_cart())
+    if priced.is_empty:
         flash('購物車為空', 'warning')
         return redirect(url_for('frontend.cart'))
-    return render_template('frontend/checkout.html', cart=cart)
+    # 每次渲染使用新的冪等鍵，網路重試時沿用
+    return render_template('frontend/checkout.html', cart=priced, idempotency_key=uuid.uuid4().hex)
 
 @frontend_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -110,18 +134,31 @@ def logout():
 @frontend_bp.route('/orders')
 @login_required
 def orders():
-    """訂單列表"""
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
-    return render_template('frontend/orders.html', orders=orders)
+    """訂單列表（游標分頁，含歸檔訂單，固定查詢數）"""
+    orders, next_cursor = paginate_user_orders(
+        current_user.id, request.args.get('before'), limit=ORDER_HISTORY_PAGE_SIZE
+    )
+    order_items = load_order_items(orders)
+    # 舊訂單項目沒有縮圖快照時，批量補查目前的產品圖片
+    thumbnails = load_product_thumbnails(
+        item.product_id for items in order_items.values() for item in items
+        if not item.product_image
+    )
+    return render_template('frontend/orders.html', orders=orders, order_items=order_items,
+                           thumbnails=thumbnails, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('before'))
+
+@frontend_bp.route('/orders/stream')
+@login_required
+def orders_stream():
+    """訂單狀態即時推送（SSE）"""
+    return order_event_stream(user_id=current_user.id)
 
 @frontend_bp.route('/create-order', methods=['POST'])
+@idempotent
 def create_order():
     """創建訂單"""
     try:
-        cart = get_or_create_cart()
-        if cart.cart_items.count() == 0:
-            return jsonify({'status': 'error', 'message': '購物車為空'}), 400
-        
         # 獲取表單數據
         customer_name = request.form.get('customer_name')
         customer_phone = request.form.get('customer_phone')
@@ -133,43 +170,25 @@ def create_order():
         if not customer_name or not customer_phone:
             return jsonify({'status': 'error', 'message': '請填寫姓名和手機號'}), 400
         
-        # 如果用戶已登入，更新用戶資料
+        # 如果用戶已登入，更新用戶資料（與訂單一併提交）
         if current_user.is_authenticated:
             if customer_phone:
                 current_user.phone = customer_phone
             if delivery_address:
                 current_user.address = delivery_address
         
-        # 創建訂單
-        order = Order(
+        order = checkout_cart(
+            find_cart(),
             user_id=current_user.id if current_user.is_authenticated else None,
             customer_name=customer_name,
             customer_phone=customer_phone,
             customer_email=customer_email,
             payment_method=payment_method,
-            notes=notes,
-            total_amount=cart.total_amount
+            notes=notes
         )
-        
-        db.session.add(order)
-        db.session.flush()  # 獲取訂單ID
-        
-        # 創建訂單項
-        for cart_item in cart.cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                product_name=cart_item.product.name,
-                product_price=cart_item.unit_price,
-                quantity=cart_item.quantity,
-                temperature=cart_item.temperature,
-                line_total=cart_item.line_total
-            )
-            db.session.add(order_item)
-        
-        # 清空購物車
-        cart.cart_items.delete()
-        db.session.commit()
+        if order is None:
+            db.session.rollback()
+            return jsonify({'status': 'error', 'message': '購物車為空'}), 400
         
         return jsonify({
             'status': 'success',
@@ -180,27 +199,3 @@ def create_order():
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': '訂單創建失敗: ' + str(e)}), 500
-
-def get_or_create_cart():
-    """獲取或創建購物車"""
-    if current_user.is_authenticated:
-        cart = Cart.query.filter_by(user_id=current_user.id).first()
-        if not cart:
-            cart = Cart(user_id=current_user.id)
-            db.session.add(cart)
-            db.session.commit()
-    else:
-        # 遊客購物車
-        session_id = session.get('session_id')
-        if not session_id:
-            import uuid
-            session_id = str(uuid.uuid4())
-            session['session_id'] = session_id
-        
-        cart = Cart.query.filter_by(session_id=session_id).first()
-        if not cart:
-            cart = Cart(session_id=session_id)
-            db.session.add(cart)
-            db.session.commit()
-    
-    return cart
@@ -0,0 +1,83 @@
+"""購物車批量操作：無效 ID 返回 400，查詢數不隨操作數增長"""
+import pytest
+from sqlalchemy import event
+
+from application import create_app
+from database import db
+from models import Product, User
+
+PRODUCTS = 10
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        for i in range(PRODUCTS):
+            db.session.add(Product(name=f'drink {i}', price=50, is_active=True))
+        user = User(name='cart', email='cart@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/login', data={'email': 'cart@example.com', 'password': 'secret'})
+    assert response.status_code == 302
+    return client
+
+
+def _batch(client, operations):
+    return client.post('/api/cart/batch', json={'operations': operations})
+
+
+def _cart_item_selects(app, client, operations):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'cart_items' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = _batch(client, operations)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('operation', [
+    {'op': 'add', 'product_id': [1]},
+    {'op': 'add', 'product_id': {'id': 1}},
+    {'op': 'update', 'item_id': [1], 'quantity': 2},
+    {'op': 'remove', 'item_id': {'id': 1}},
+    {'op': 'add', 'product_id': 1, 'quantity': True},
+])
+def test_non_integer_ids_are_rejected(client, operation):
+    response = _batch(client, [operation])
+    assert response.status_code == 400
+    assert response.get_json()['index'] == 0
+
+
+def test_batch_update_query_count_is_constant(app, client):
+    response = _batch(client, [{'op': 'add', 'product_id': i + 1} for i in range(PRODUCTS)])
+    item_ids = [item['id'] for item in response.get_json()['items']]
+    assert len(item_ids) == PRODUCTS
+
+    few = _cart_item_selects(app, client, [
+        {'op': 'update', 'item_id': item_id, 'quantity': 2} for item_id in item_ids[:2]
+    ])
+    many = _cart_item_selects(app, client, [
+        {'op': 'update', 'item_id': item_id, 'quantity': 3} for item_id in item_ids[:-1]
+    ] + [{'op': 'remove', 'item_id': item_ids[-1]}])
+    assert few == many
@@ -0,0 +1,84 @@
+"""會員訂單記錄頁的查詢數不隨歷史訂單數增長"""
+import pytest
+from sqlalchemy import event
+
+from application import create_app
+from database import db
+from models import Order, OrderItem, Product, ProductImage, User
+
+ITEMS_PER_ORDER = 3
+SHORT_HISTORY = 3
+LONG_HISTORY = 40
+MAX_QUERIES_PER_REQUEST = 6
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def _create_user(app, email, orders):
+    """建立用戶與 orders 筆訂單；一半的訂單項目沒有縮圖快照"""
+    with app.app_context():
+        products = []
+        for i in range(ITEMS_PER_ORDER):
+            product = Product(name=f'{email} drink {i}', price=50, is_active=True)
+            db.session.add(product)
+            db.session.flush()
+            db.session.add(ProductImage(product_id=product.id, image=f'{product.id}.webp'))
+            products.append(product)
+
+        user = User(name=email, email=email)
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.flush()
+        for n in range(orders):
+            order = Order(user_id=user.id, customer_name='Test', customer_phone='0900',
+                          total_amount=150)
+            db.session.add(order)
+            db.session.flush()
+            for j, product in enumerate(products):
+                db.session.add(OrderItem(
+                    order_id=order.id, product_id=product.id, product_name=product.name,
+                    product_price=50, quantity=1, line_total=50,
+                    product_image=f'{product.id}.webp' if (n + j) % 2 else None
+                ))
+        db.session.commit()
+
+
+def _queries_per_request(app, email):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': 'secret'})
+    assert response.status_code == 302
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get('/orders')
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_order_history_query_count_is_constant(app):
+    _create_user(app, 'short@example.com', SHORT_HISTORY)
+    _create_user(app, 'long@example.com', LONG_HISTORY)
+
+    short = _queries_per_request(app, 'short@example.com')
+    long = _queries_per_request(app, 'long@example.com')
+
+    assert short == long
+    assert long <= MAX_QUERIES_PER_REQUEST
@@ -0,0 +1,69 @@
+"""並發的相同狀態轉換只有一方成功"""
+import pytest
+
+import config
+import utils.order_status as order_status
+from application import create_app
+from database import db
+from models import Order, OrderEvent
+from utils.counters import _read_counters
+from utils.order_status import CONFLICT, UPDATED, transition_order
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # 兩個會話需各自的連接，記憶體資料庫只有一個共享連接
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                        f"sqlite:///{tmp_path / 'orders.db'}")
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def _create_order(app):
+    with app.app_context():
+        order = Order(customer_name='Test', customer_phone='0900', total_amount=100)
+        db.session.add(order)
+        db.session.commit()
+        return order.id, order.version
+
+
+def test_stale_concurrent_transition_conflicts(app, monkeypatch):
+    order_id, version = _create_order(app)
+    original = order_status._conditional_update
+    winner = []
+
+    def interleaved(*args):
+        # 在本請求讀取之後、條件更新之前，另一請求以相同版本完成同一轉換並提交
+        if not winner:
+            with app.app_context():
+                winner.append(original(*args))
+                db.session.commit()
+        return original(*args)
+
+    monkeypatch.setattr(order_status, '_conditional_update', interleaved)
+    with app.app_context():
+        result = transition_order(order_id, 'confirmed', version)
+        db.session.commit()
+
+        assert winner == [True]
+        assert result.outcome == CONFLICT
+        assert (result.status, result.version) == ('confirmed', version + 1)
+        assert OrderEvent.query.filter_by(order_id=order_id).count() == 0
+        assert _read_counters()[0]['pending_orders'] == 1
+
+
+def test_transition_records_event_and_counters(app):
+    order_id, version = _create_order(app)
+    with app.app_context():
+        result = transition_order(order_id, 'confirmed', version)
+        db.session.commit()
+
+        assert result.outcome == UPDATED
+        assert result.version == version + 1
+        assert OrderEvent.query.filter_by(order_id=order_id).count() == 1
+        assert _read_counters()[0]['pending_orders'] == 0
@@ -0,0 +1,57 @@
+"""產品增量同步：游標不越過可能晚提交的變更，菜單版本號逐次遞增"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+from application import create_app
+from database import db
+from models import Product, ProductChange
+from utils.menu_cache import COMMIT_GRACE, current_version, invalidate_menu
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.TestingConfig, 'MENU_VERSION_FILE', str(tmp_path / 'menu.version'))
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def _age_changes(ids, seconds):
+    ProductChange.query.filter(ProductChange.id.in_(ids)).update(
+        {'changed_at': datetime.utcnow() - timedelta(seconds=seconds)}, synchronize_session=False)
+    db.session.commit()
+
+
+def test_cursor_waits_for_commit_grace(app):
+    client = app.test_client()
+    with app.app_context():
+        for name in ('synced', 'first', 'second', 'third'):
+            db.session.add(Product(name=name, price=10, is_active=True))
+            db.session.commit()
+        ids = [change.id for change in ProductChange.query.order_by(ProductChange.id)]
+        # 中間的變更在寬限期內寫入：之後的變更即使已可見，游標也不越過它
+        _age_changes([ids[0], ids[1], ids[3]], COMMIT_GRACE * 2)
+
+    data = client.get(f'/api/products/changes?since={ids[0]}').get_json()
+    assert data['cursor'] == ids[1]
+    assert [item['name'] for item in data['updated']] == ['first']
+
+    with app.app_context():
+        _age_changes([ids[2]], COMMIT_GRACE * 2)
+    data = client.get(f'/api/products/changes?since={ids[1]}').get_json()
+    assert data['cursor'] == ids[3]
+    assert [item['name'] for item in data['updated']] == ['second', 'third']
+
+
+def test_menu_version_increments_on_every_invalidation(app):
+    with app.app_context():
+        first = invalidate_menu()
+        second = invalidate_menu()
+        assert second == first + 1
+        assert current_version() == second
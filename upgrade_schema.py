@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Schema Upgrade Script
+Bring an existing database up to date with the current models:
+create new tables, add new columns and indexes to existing tables.
+Safe to run more than once.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import inspect, text
+
+from application import create_app
+from database import db
+from models import CartItem
+from models.cart import cart_item_signature
+
+# Columns added to existing tables: (table, column, default for existing rows)
+NEW_COLUMNS = [
+    ('orders', 'version', '1'),
+    ('order_items', 'product_image', None),
+    ('cart_items', 'signature', "''"),
+    ('idempotency_keys', 'claimed_at', None),
+    ('product_images', 'status', "'ready'"),
+    ('store_images', 'status', "'ready'"),
+]
+
+# Derived tables whose primary key gained a shard column; rebuilt from orders
+SHARDED_TABLES = ['dashboard_counters', 'sales_hourly', 'sales_daily']
+
+
+def add_column_sql(table, column, default, dialect):
+    """Build the ALTER TABLE statement for a model column"""
+    sql = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}"
+    if default is not None:
+        sql += f" DEFAULT {default}"
+    if not column.nullable:
+        sql += " NOT NULL"
+    return sql
+
+
+def rebuild_sharded_tables(connection):
+    """Drop and recreate derived tables created before sharding, return the tables left empty"""
+    inspector = inspect(connection)
+    rebuilt = []
+    for name in SHARDED_TABLES:
+        if not inspector.has_table(name):
+            # Created empty by create_all
+            rebuilt.append(name)
+            continue
+        if 'shard' in [column['name'] for column in inspector.get_columns(name)]:
+            continue
+        table = db.metadata.tables[name]
+        table.drop(connection)
+        table.create(connection)
+        rebuilt.append(name)
+        print(f"Rebuilt table {name}")
+    return rebuilt
+
+
+def add_columns(connection):
+    """Add missing columns to existing tables"""
+    inspector = inspect(connection)
+    added = []
+    for table_name, column_name, default in NEW_COLUMNS:
+        if not inspector.has_table(table_name):
+            continue
+        existing = [column['name'] for column in inspector.get_columns(table_name)]
+        if column_name in existing:
+            continue
+        table = db.metadata.tables[table_name]
+        sql = add_column_sql(table, table.c[column_name], default, connection.dialect)
+        connection.execute(text(sql))
+        added.append((table_name, column_name))
+        print(sql)
+    return added
+
+
+def backfill_cart_signatures(connection):
+    """Fill in cart item signatures and merge items with the same configuration"""
+    if not inspect(connection).has_table('cart_items'):
+        return
+    items = CartItem.__table__
+    rows = connection.execute(
+        items.select().where(items.c.signature == '').order_by(items.c.id)
+    ).mappings().all()
+    for row in rows:
+        connection.execute(items.update().where(items.c.id == row['id']).values(
+            signature=cart_item_signature(row['temperature'], row['ingredients'])
+        ))
+
+    # The new unique constraint allows one row per (cart, product, configuration)
+    groups = defaultdict(list)
+    for row in connection.execute(items.select().order_by(items.c.id)).mappings():
+        groups[(row['cart_id'], row['product_id'], row['signature'])].append(row)
+    merged = 0
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        keep, duplicates = group[0], group[1:]
+        connection.execute(items.update().where(items.c.id == keep['id']).values(
+            quantity=sum(row['quantity'] for row in group)
+        ))
+        connection.execute(items.delete().where(items.c.id.in_([row['id'] for row in duplicates])))
+        merged += len(duplicates)
+    if rows or merged:
+        print(f"Backfilled {len(rows)} cart item signatures, merged {merged} duplicate items")
+
+
+def create_indexes(connection):
+    """Create missing indexes and unique constraints on existing tables"""
+    inspector = inspect(connection)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        existing |= {constraint['name'] for constraint in inspector.get_unique_constraints(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+                created.append(index.name)
+                print(f"Created index {index.name}")
+        for constraint in table.constraints:
+            if isinstance(constraint, db.UniqueConstraint) and constraint.name \
+                    and constraint.name not in existing:
+                # Added as a unique index so that SQLite can add it to an existing table
+                columns = ', '.join(column.name for column in constraint.columns)
+                connection.execute(text(f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})"))
+                created.append(constraint.name)
+                print(f"Created unique index {constraint.name}")
+    return created
+
+
+def upgrade_schema():
+    """Upgrade database schema"""
+    app = create_app()
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            rebuilt = rebuild_sharded_tables(connection)
+            add_columns(connection)
+            backfill_cart_signatures(connection)
+            create_indexes(connection)
+
+        print("Creating new tables...")
+        db.create_all()
+        print("Schema upgrade completed!")
+
+        if rebuilt:
+            print("\nCounter and sales rollup tables are empty, populate them with:")
+            print("  flask reconcile-counters")
+            print("  flask rebuild-sales-rollups")
+
+if __name__ == '__main__':
+    upgrade_schema()
@@ -0,0 +1,59 @@
+# 購物車計價引擎
+from utils.pricing import get_price_table, get_unit_price
+
+
+class PricedLine:
+    """已計價的購物車項目"""
+
+    __slots__ = ('id', 'product_id', 'product', 'quantity', 'temperature',
+                 'ingredients', 'base_price', 'unit_price', 'line_total')
+
+    def __init__(self, item, table):
+        self.id = item.id
+        self.product_id = item.product_id
+        self.product = item.product
+        self.quantity = item.quantity
+        self.temperature = item.temperature
+        # 舊資料只存配料 ID，統一解析為 {id, name, price}
+        ingredients = item.ingredients or []
+        if not all(isinstance(ingredient, dict) for ingredient in ingredients):
+            ingredients = table.resolve_ingredients(item.product_id, ingredients)
+        self.ingredients = ingredients
+        self.base_price = get_unit_price(item.product_id, item.temperature, table=table)
+        self.unit_price = get_unit_price(item.product_id, item.temperature, item.ingredients, table=table)
+        self.line_total = self.unit_price * item.quantity
+
+    def __repr__(self):
+        return f'<PricedLine {self.product_id} x{self.quantity}>'
+
+
+class PricedCart:
+    """已計價的購物車視圖"""
+
+    __slots__ = ('cart', 'lines', 'total_items', 'total_amount')
+
+    def __init__(self, cart, lines):
+        self.cart = cart
+        self.lines = lines
+        self.total_items = sum(line.quantity for line in lines)
+        self.total_amount = sum(line.line_total for line in lines)
+
+    @property
+    def is_empty(self):
+        return not self.lines
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __repr__(self):
+        return f'<PricedCart {self.cart.id} lines={len(self.lines)}>'
+
+
+def price_cart(cart, with_images=True):
+    """一次性計算購物車所有項目的單價、小計與總額"""
+    table = get_price_table()
+    items = cart.load_items(with_images=with_images)
+    return PricedCart(cart, [PricedLine(item, table) for item in items])
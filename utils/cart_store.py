@@ -0,0 +1,274 @@
+# 購物車存取
+import os
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import current_app, session
+from flask_login import current_user, user_logged_in
+from sqlalchemy.orm import selectinload
+
+from database import db
+from models import Cart, CartItem, Product
+from models.cart import cart_item_signature
+from utils.kv_store import MemoryKVStore, SQLiteKVStore
+
+
+class GuestCartItem:
+    """遊客購物車項目（與 CartItem 具有相同的讀取屬性）"""
+
+    __slots__ = ('id', 'product_id', 'product', 'quantity', 'temperature', 'ingredients')
+
+    def __init__(self, data, product):
+        self.id = data['id']
+        self.product_id = data['product_id']
+        self.product = product
+        self.quantity = data['quantity']
+        self.temperature = data.get('temperature', 'normal')
+        self.ingredients = data.get('ingredients') or []
+
+    def __repr__(self):
+        return f'<GuestCartItem {self.product_id} x{self.quantity}>'
+
+
+class GuestCart:
+    """存放於鍵值存儲的遊客購物車，介面與 Cart 相同"""
+
+    def __init__(self, store, session_id, ttl):
+        self.store = store
+        self.session_id = session_id
+        self.user_id = None
+        self.ttl = ttl
+        self._key = f'cart:{session_id}'
+        self._data = store.get(self._key) if session_id else None
+        self._pending = None
+
+    @property
+    def id(self):
+        """遊客購物車沒有資料庫 ID"""
+        return None
+
+    @property
+    def items(self):
+        return (self._data or {}).get('items', [])
+
+    def load_items(self, with_images=True):
+        """載入項目並批量載入商品（可選圖片）"""
+        items = self.items
+        if not items:
+            return []
+        query = Product.query.filter(Product.id.in_({item['product_id'] for item in items}))
+        if with_images:
+            query = query.options(selectinload(Product.images))
+        products = {p.id: p for p in query}
+        return [GuestCartItem(item, products[item['product_id']])
+                for item in items if item['product_id'] in products]
+
+    def _mutate(self, func):
+        """原子地修改購物車資料；批量模式下延後至批次結束一次寫入"""
+        if self._pending is not None:
+            self._pending.append(func)
+            return
+
+        def apply(data):
+            data = data or {'next_id': 1, 'items': []}
+            func(data)
+            return data
+        self._data = self.store.update(self._key, apply, self.ttl)
+
+    @contextmanager
+    def batch(self):
+        """批量修改：所有操作在一次原子寫入中完成，發生異常時全部放棄"""
+        self._pending = []
+        try:
+            yield self
+            pending = self._pending
+        finally:
+            self._pending = None
+
+        if pending:
+            def apply_all(data):
+                for func in pending:
+                    func(data)
+            self._mutate(apply_all)
+
+    def add_item(self, product_id, quantity, temperature='normal', ingredients=None):
+        """添加商品，相同配置的商品合併數量"""
+        signature = cart_item_signature(temperature, ingredients)
+
+        def apply(data):
+            for item in data['items']:
+                if item['product_id'] == product_id and \
+                        cart_item_signature(item['temperature'], item['ingredients']) == signature:
+                    item['quantity'] += quantity
+                    return
+            data['items'].append({
+                'id': data['next_id'],
+                'product_id': product_id,
+                'quantity': quantity,
+                'temperature': temperature,
+                'ingredients': ingredients or []
+            })
+            data['next_id'] += 1
+        self._mutate(apply)
+
+    def update_item(self, item_id, quantity):
+        """更新項目數量，數量小於等於 0 時移除；項目不存在時返回 False"""
+        if not any(item['id'] == item_id for item in self.items):
+            return False
+
+        def apply(data):
+            if quantity <= 0:
+                data['items'] = [item for item in data['items'] if item['id'] != item_id]
+            else:
+                for item in data['items']:
+                    if item['id'] == item_id:
+                        item['quantity'] = quantity
+        self._mutate(apply)
+        return True
+
+    def remove_item(self, item_id):
+        """移除項目；項目不存在時返回 False"""
+        return self.update_item(item_id, 0)
+
+    def clear(self):
+        """清空購物車"""
+        self.store.delete(self._key)
+        self._data = None
+
+    def __repr__(self):
+        return f'<GuestCart {self.session_id}>'
+
+
+def _guest_store():
+    """獲取遊客購物車存儲，使用資料庫存放時返回 None"""
+    return current_app.extensions['cart_store']['store']
+
+
+def _guest_session_id(create=False):
+    """獲取遊客會話 ID，create 為 True 時不存在則生成"""
+    session_id = session.get('session_id')
+    if not session_id and create:
+        session_id = str(uuid.uuid4())
+        session['session_id'] = session_id
+    return session_id
+
+
+def _guest_cart(session_id):
+    store = _guest_store()
+    if store is None:
+        return None
+    return GuestCart(store, session_id, current_app.config['GUEST_CART_TTL'])
+
+
+def find_cart():
+    """只讀獲取購物車；不存在時返回未保存的空購物車，不寫入資料庫"""
+    if current_user.is_authenticated:
+        owner = {'user_id': current_user.id}
+    else:
+        session_id = _guest_session_id()
+        guest = _guest_cart(session_id)
+        if guest is not None:
+            return guest
+        owner = {'session_id': session_id} if session_id else None
+
+    cart = Cart.query.filter_by(**owner).first() if owner else None
+    return cart or Cart(**(owner or {}))
+
+
+def get_or_create_cart():
+    """獲取或創建購物車（僅在修改購物車時使用）"""
+    if current_user.is_authenticated:
+        owner = {'user_id': current_user.id}
+    else:
+        session_id = _guest_session_id(create=True)
+        guest = _guest_cart(session_id)
+        if guest is not None:
+            return guest
+        owner = {'session_id': session_id}
+
+    cart = Cart.query.filter_by(**owner).first()
+    if not cart:
+        cart = Cart(**owner)
+        db.session.add(cart)
+        db.session.flush()  # 與本次修改一併提交
+    return cart
+
+
+def promote_guest_cart(user):
+    """登入時將遊客購物車併入用戶購物車"""
+    session_id = _guest_session_id()
+    if not session_id:
+        return
+    guest = _guest_cart(session_id) or Cart.query.filter_by(session_id=session_id).first()
+    if guest is None:
+        return
+    items = guest.load_items()
+    if not items:
+        return
+
+    cart = Cart.query.filter_by(user_id=user.id).first()
+    if not cart:
+        cart = Cart(user_id=user.id)
+        db.session.add(cart)
+        db.session.flush()
+    for item in items:
+        cart.add_item(item.product_id, item.quantity, item.temperature, item.ingredients)
+    db.session.commit()
+    guest.clear()
+
+
+def reap_abandoned_carts(ttl=None, batch_size=500, now=None):
+    """分批刪除閒置超過 ttl 秒的遊客購物車，返回 (購物車數, 項目數, 過期鍵數)"""
+    ttl = ttl if ttl is not None else current_app.config['GUEST_CART_TTL']
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=ttl)
+    carts_deleted = items_deleted = 0
+
+    while True:
+        # 每批獨立提交，避免長時間鎖表
+        cart_ids = [row[0] for row in db.session.query(Cart.id).filter(
+            Cart.user_id.is_(None),
+            Cart.updated_at < cutoff
+        ).order_by(Cart.updated_at).limit(batch_size)]
+        if not cart_ids:
+            break
+        items_deleted += CartItem.query.filter(
+            CartItem.cart_id.in_(cart_ids)
+        ).delete(synchronize_session=False)
+        carts_deleted += Cart.query.filter(
+            Cart.id.in_(cart_ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    keys_deleted = 0
+    store = _guest_store()
+    if store is not None:
+        while True:
+            purged = store.purge_expired(limit=batch_size)
+            keys_deleted += purged
+            if purged < batch_size:
+                break
+
+    return carts_deleted, items_deleted, keys_deleted
+
+
+def _on_user_logged_in(sender, user, **extra):
+    promote_guest_cart(user)
+
+
+def init_cart_store(app):
+    """初始化遊客購物車存儲"""
+    backend = app.config.get('GUEST_CART_BACKEND', 'database')
+    if backend == 'sqlite':
+        path = app.config.get('GUEST_CART_STORE') or \
+            os.path.join(app.instance_path, 'guest_carts.sqlite3')
+        store = SQLiteKVStore(path)
+    elif backend == 'memory':
+        store = MemoryKVStore()
+    elif backend == 'database':
+        store = None
+    else:
+        raise ValueError(f'未知的遊客購物車存儲: {backend}')
+
+    app.extensions['cart_store'] = {'store': store}
+    user_logged_in.connect(_on_user_logged_in, app)
@@ -0,0 +1,83 @@
+# 結帳服務
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import CartItem, Order, OrderItem
+from utils.cart_pricing import price_cart
+from utils.order_events import record_order_event
+from utils.order_queries import load_product_thumbnails
+from utils.sales_rollups import record_order_sales
+
+# 可由客戶提交的訂單欄位
+ORDER_FIELDS = ('customer_name', 'customer_phone', 'customer_email', 'payment_method', 'notes')
+# 必填的訂單欄位（資料庫為 NOT NULL）
+REQUIRED_FIELDS = ('customer_name', 'customer_phone')
+ORDER_NUMBER_RETRIES = 3
+
+
+def _is_order_number_conflict(exc):
+    """是否為訂單號唯一約束衝突（PostgreSQL 提供約束名，其他資料庫從錯誤訊息判斷）"""
+    constraint = getattr(getattr(exc.orig, 'diag', None), 'constraint_name', None)
+    return 'order_number' in (constraint or str(exc.orig))
+
+
+def _insert_order(**values):
+    """寫入訂單；訂單號衝突時在 savepoint 內重新生成並重試，其他完整性錯誤直接拋出"""
+    for attempt in range(ORDER_NUMBER_RETRIES):
+        order = Order(**values)
+        try:
+            with db.session.begin_nested():
+                db.session.add(order)
+            return order  # savepoint 結束時已 flush，訂單ID可用
+        except IntegrityError as e:
+            if not _is_order_number_conflict(e) or attempt == ORDER_NUMBER_RETRIES - 1:
+                raise
+
+
+def checkout_cart(cart, user_id=None, **fields):
+    """將購物車轉為訂單：一次載入、批量寫入項目、批量清空購物車，只提交一次
+
+    購物車為空時返回 None；缺少必填欄位時拋出 ValueError（寫入前檢查，不佔用訂單號）。
+    """
+    missing = [key for key in REQUIRED_FIELDS if not fields.get(key)]
+    if missing:
+        raise ValueError(f"缺少必填欄位: {', '.join(missing)}")
+
+    priced = price_cart(cart, with_images=False)
+    if priced.is_empty:
+        return None
+
+    order = _insert_order(
+        user_id=user_id,
+        total_amount=round(priced.total_amount, 2),
+        **{key: fields.get(key) for key in ORDER_FIELDS}
+    )
+
+    # executemany 批量寫入訂單項目（名稱與縮圖一併快照，訂單頁無需再讀取產品）
+    thumbnails = load_product_thumbnails(line.product_id for line in priced.lines)
+    db.session.execute(insert(OrderItem), [{
+        'order_id': order.id,
+        'product_id': line.product_id,
+        'product_name': line.product.name,
+        'product_price': round(line.base_price, 2),
+        'product_image': thumbnails.get(line.product_id),
+        'quantity': line.quantity,
+        'line_total': round(line.line_total, 2),
+        'temperature': line.temperature,
+        'ingredients': line.ingredients
+    } for line in priced.lines])
+
+    # 新訂單推送給廚房並計入銷售彙總
+    record_order_event(order.id, user_id, order.status, order.version)
+    record_order_sales(order, priced.total_items)
+
+    # 資料庫購物車與訂單在同一交易中清空
+    if cart.id is not None:
+        CartItem.query.filter_by(cart_id=cart.id).delete(synchronize_session=False)
+    db.session.commit()
+
+    # 遊客購物車在訂單提交成功後才清空
+    if cart.id is None:
+        cart.clear()
+    return order
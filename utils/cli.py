@@ -0,0 +1,89 @@
+# 命令行工具
+import click
+
+
+def init_cli(app):
+    """註冊 flask 命令"""
+
+    @app.cli.command('reap-carts')
+    @click.option('--ttl', type=int, default=None, help='閒置秒數，預設為 GUEST_CART_TTL')
+    @click.option('--batch-size', type=int, default=500, show_default=True, help='每批刪除數量')
+    def reap_carts(ttl, batch_size):
+        """清理閒置的遊客購物車"""
+        from utils.cart_store import reap_abandoned_carts
+        carts, items, keys = reap_abandoned_carts(ttl=ttl, batch_size=batch_size)
+        click.echo(f'已清理購物車 {carts} 個、項目 {items} 筆、過期鍵 {keys} 個')
+
+    @app.cli.command('purge-idempotency-keys')
+    @click.option('--batch-size', type=int, default=1000, show_default=True, help='每批刪除數量')
+    def purge_idempotency_keys(batch_size):
+        """清理過期的下單冪等鍵"""
+        from utils.idempotency import purge_expired_keys
+        deleted = purge_expired_keys(batch_size=batch_size)
+        click.echo(f'已清理冪等鍵 {deleted} 個')
+
+    @app.cli.command('purge-order-events')
+    @click.option('--max-age', type=int, default=7 * 24 * 3600, show_default=True, help='保留秒數')
+    @click.option('--batch-size', type=int, default=1000, show_default=True, help='每批刪除數量')
+    def purge_order_events_command(max_age, batch_size):
+        """清理過期的訂單狀態事件"""
+        from utils.order_events import purge_order_events
+        deleted = purge_order_events(max_age, batch_size=batch_size)
+        click.echo(f'已清理訂單事件 {deleted} 筆')
+
+    @app.cli.command('purge-product-changes')
+    @click.option('--max-age', type=int, default=None, help='保留秒數，預設為 PRODUCT_CHANGES_RETENTION')
+    @click.option('--batch-size', type=int, default=1000, show_default=True, help='每批刪除數量')
+    def purge_product_changes_command(max_age, batch_size):
+        """清理過期的產品變更日誌"""
+        from utils.menu_cache import purge_product_changes
+        deleted = purge_product_changes(max_age, batch_size=batch_size)
+        click.echo(f'已清理產品變更日誌 {deleted} 筆')
+
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters_command():
+        """以 COUNT 校正後台統計計數"""
+        from utils.counters import reconcile_counters
+        for name, value in reconcile_counters().items():
+            click.echo(f'{name}: {value}')
+
+    @app.cli.command('rebuild-sales-rollups')
+    @click.option('--batch-size', type=int, default=1000, show_default=True, help='每批讀取訂單數')
+    def rebuild_sales_rollups_command(batch_size):
+        """由訂單重新計算每小時 / 每日銷售彙總"""
+        from utils.sales_rollups import rebuild_sales_rollups
+        count = rebuild_sales_rollups(batch_size=batch_size)
+        click.echo(f'已重新計算 {count} 筆訂單的銷售彙總')
+
+    @app.cli.command('export-orders')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv', show_default=True)
+    @click.option('--status', multiple=True, help='訂單狀態，可重複指定')
+    @click.option('--date-from', type=click.DateTime(['%Y-%m-%d']), default=None, help='開始日期（含）')
+    @click.option('--date-to', type=click.DateTime(['%Y-%m-%d']), default=None, help='結束日期（含）')
+    @click.option('--batch-size', type=int, default=1000, show_default=True, help='每批讀取行數')
+    @click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='輸出文件，預設為標準輸出')
+    def export_orders_command(fmt, status, date_from, date_to, batch_size, output):
+        """串流匯出訂單（CSV / JSONL）"""
+        from datetime import timedelta
+        from utils.order_export import export_orders
+        end = date_to + timedelta(days=1) if date_to else None
+        for chunk in export_orders(fmt, date_from, end, list(status) or None, batch_size):
+            output.write(chunk)
+
+    @app.cli.command('archive-orders')
+    @click.option('--max-age', type=int, default=None, help='歸檔超過此秒數的訂單，預設為 ORDER_ARCHIVE_AFTER')
+    @click.option('--batch-size', type=int, default=500, show_default=True, help='每批搬移訂單數')
+    def archive_orders_command(max_age, batch_size):
+        """將舊的已完成 / 已取消訂單分批移入歸檔表"""
+        from utils.order_archive import archive_orders
+        orders, items = archive_orders(max_age=max_age, batch_size=batch_size)
+        click.echo(f'已歸檔 {orders} 筆訂單、{items} 筆訂單項目')
+
+    @app.cli.command('process-pending-images')
+    @click.option('--min-age', type=int, default=600, show_default=True, help='只處理建立超過此秒數的 pending 圖片')
+    @click.option('--retry-failed', is_flag=True, help='同時重試轉換失敗的圖片')
+    def process_pending_images_command(min_age, retry_failed):
+        """同步轉換遺留的 pending 圖片（進程池佇列已滿或 worker 重啟時）"""
+        from utils.image_pipeline import process_pending_images
+        ready, failed = process_pending_images(min_age=min_age, retry_failed=retry_failed)
+        click.echo(f'已處理 {ready} 張圖片，失敗 {failed} 張')
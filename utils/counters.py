@@ -0,0 +1,146 @@
+# 後台統計計數
+import random
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from database import db
+from models import ArchivedOrder, DashboardCounter, Order, Product, User
+
+# 計數名稱 -> 校正用的 COUNT 查詢
+COUNTER_QUERIES = {
+    'products': lambda: select(func.count()).select_from(Product),
+    # 歸檔訂單仍計入總數（歸檔以 Core 搬移，不觸發 flush 計數）
+    'orders': lambda: select(select(func.count()).select_from(Order).scalar_subquery()
+                             + select(func.count()).select_from(ArchivedOrder).scalar_subquery()),
+    'users': lambda: select(func.count()).select_from(User),
+    'pending_orders': lambda: select(func.count()).select_from(Order).where(Order.status == 'pending')
+}
+
+# 模型 -> 總數計數名稱
+MODEL_COUNTERS = {Product: 'products', Order: 'orders', User: 'users'}
+
+
+def _upsert_increment(connection, name, shard, delta):
+    """累加 (name, shard) 行，行不存在時建立"""
+    table = DashboardCounter.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(table).values(name=name, shard=shard, value=delta)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['name', 'shard'], set_={'value': table.c.value + stmt.excluded.value}
+        ))
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as upsert
+        stmt = upsert(table).values(name=name, shard=shard, value=delta)
+        connection.execute(stmt.on_duplicate_key_update(value=table.c.value + stmt.inserted.value))
+    else:
+        result = connection.execute(
+            update(table).where(table.c.name == name, table.c.shard == shard)
+            .values(value=table.c.value + delta)
+        )
+        if not result.rowcount:
+            connection.execute(insert(table).values(name=name, shard=shard, value=delta))
+
+
+def increment_counters(connection, deltas):
+    """在當前交易中增減計數
+
+    每次寫入隨機選擇一個分片行，並發下單不會在同一行上排隊；讀取時按名稱加總。
+    名稱依序寫入，並發交易以相同順序加鎖，不會互相死鎖。
+    """
+    shard = random.randrange(current_app.config.get('COUNTER_SHARDS', 16)) if has_app_context() else 0
+    for name in sorted(deltas):
+        if deltas[name]:
+            _upsert_increment(connection, name, shard, deltas[name])
+
+
+def reconcile_counters():
+    """以 COUNT 校正所有計數並提交，返回 名稱 -> 數值
+
+    校正值以增量寫入基礎分片（shard 0）：COUNT 與現有分片總和在同一語句中讀取（同一快照），
+    期間提交的增減不會被覆蓋。先鎖定基礎分片，並發的校正依序執行。
+    """
+    table = DashboardCounter.__table__
+    now = datetime.utcnow()
+    connection = db.session.connection()
+    for name, query in COUNTER_QUERIES.items():
+        base = (table.c.name == name) & (table.c.shard == 0)
+        _upsert_increment(connection, name, 0, 0)
+        connection.execute(update(table).where(base).values(reconciled_at=now))
+        current = select(func.coalesce(func.sum(table.c.value), 0)).where(table.c.name == name)
+        correction = connection.execute(
+            select(query().scalar_subquery() - current.scalar_subquery())
+        ).scalar()
+        if correction:
+            connection.execute(update(table).where(base).values(value=table.c.value + correction))
+    db.session.commit()
+    return _read_counters()[0]
+
+
+def _read_counters():
+    """返回 (名稱 -> 分片總和, 已校正的名稱)"""
+    table = DashboardCounter.__table__
+    rows = db.session.execute(
+        select(table.c.name, func.sum(table.c.value), func.count(table.c.reconciled_at))
+        .group_by(table.c.name)
+    ).all()
+    return ({name: int(value) for name, value, _ in rows},
+            {name for name, _, reconciled in rows if reconciled})
+
+
+def get_counters():
+    """單次查詢讀取所有計數；首次使用（未校正）時先校正"""
+    values, reconciled = _read_counters()
+    if any(name not in reconciled for name in COUNTER_QUERIES):
+        values = reconcile_counters()
+    return values
+
+
+def _order_status_change(order):
+    """ORM 修改訂單狀態時返回 (舊狀態, 新狀態)，未修改返回 None"""
+    history = inspect(order).attrs.status.history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _after_flush(session, flush_context):
+    deltas = Counter()
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            name = MODEL_COUNTERS.get(type(obj))
+            if name is None:
+                continue
+            deltas[name] += sign
+            if name == 'orders' and (obj.status or 'pending') == 'pending':
+                deltas['pending_orders'] += sign
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            change = _order_status_change(obj)
+            if change:
+                deltas['pending_orders'] += (change[1] == 'pending') - (change[0] == 'pending')
+
+    if any(deltas.values()):
+        increment_counters(session.connection(), deltas)
+
+
+_listeners_registered = False
+
+
+def init_counters(app):
+    """初始化後台統計計數"""
+    global _listeners_registered
+
+    if not _listeners_registered:
+        event.listen(Session, 'after_flush', _after_flush)
+        _listeners_registered = True
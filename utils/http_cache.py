@@ -0,0 +1,40 @@
+# HTTP 條件請求工具
+import hashlib
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+
+def make_etag(*parts):
+    """由版本資訊生成強 ETag 值"""
+    raw = ':'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def page_etag(*parts):
+    """頁面 ETag（頁面內容隨登入用戶變化）"""
+    user_key = current_user.get_id() if current_user.is_authenticated else 'guest'
+    return make_etag(*parts, user_key)
+
+
+def not_modified(etag, private=False):
+    """客戶端快取仍有效時返回 304 響應，否則返回 None"""
+    # 有待顯示的 flash 訊息時必須重新渲染頁面
+    if private and '_flashes' in session:
+        return None
+    if not request.if_none_match.contains(etag):
+        return None
+    response = current_app.response_class(status=304)
+    return with_etag(response, etag, private=private)
+
+
+def with_etag(response, etag, private=False):
+    """為響應加上 ETag 與快取控制標頭"""
+    response.set_etag(etag)
+    if private:
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+    else:
+        response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,133 @@
+# 冪等請求處理
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def _scope():
+    """冪等鍵的歸屬範圍，避免不同用戶的鍵互相衝突；沒有會話的遊客返回 None"""
+    if current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    session_id = session.get('session_id')
+    return f'session:{session_id}' if session_id else None
+
+
+def _request_hash():
+    """請求內容摘要；表單依欄位計算（multipart 分隔符每次請求都不同）"""
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        payload = json.dumps(sorted(request.form.items(multi=True)), ensure_ascii=False).encode()
+    else:
+        payload = request.get_data()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _replay(record):
+    """重放首次請求的響應"""
+    response = current_app.response_class(
+        record.response_body,
+        status=record.status_code,
+        mimetype=record.response_mimetype
+    )
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """帶 Idempotency-Key 標頭的請求在 TTL 內重試時直接返回首次響應，不再執行視圖"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({'status': 'error', 'message': 'Idempotency-Key 過長'}), 400
+
+        scope = _scope()
+        if scope is None:
+            # 沒有會話的遊客沒有購物車，也無法與其他遊客區分
+            return view(*args, **kwargs)
+        request_hash = _request_hash()
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=current_app.config['IDEMPOTENCY_TTL'])
+
+        record = IdempotencyKey.query.filter_by(scope=scope, key=key).first()
+        if record is not None and record.created_at < cutoff:
+            db.session.delete(record)
+            db.session.commit()
+            record = None
+        if record is not None:
+            if record.request_hash != request_hash or record.endpoint != request.endpoint:
+                return jsonify({'status': 'error', 'message': 'Idempotency-Key 已用於其他請求'}), 422
+            if record.status_code is not None:
+                return _replay(record)
+            # 處理中的鍵超過租約仍未完成（worker 被終止），以條件更新接手
+            lease_cutoff = now - timedelta(seconds=current_app.config['IDEMPOTENCY_LEASE'])
+            record_id = record.id
+            claimed = IdempotencyKey.query.filter(
+                IdempotencyKey.id == record_id,
+                IdempotencyKey.status_code.is_(None),
+                func.coalesce(IdempotencyKey.claimed_at, IdempotencyKey.created_at) < lease_cutoff
+            ).update({'claimed_at': now}, synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                return jsonify({'status': 'error', 'message': '相同請求正在處理中'}), 409
+        else:
+            # 先佔用鍵，唯一約束保證並發重試只有一個會執行
+            record = IdempotencyKey(scope=scope, key=key, endpoint=request.endpoint,
+                                    request_hash=request_hash, claimed_at=now)
+            db.session.add(record)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                return jsonify({'status': 'error', 'message': '相同請求正在處理中'}), 409
+            record_id = record.id
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(id=record_id).delete()
+            db.session.commit()
+            raise
+
+        if response.status_code >= 500:
+            # 伺服器錯誤允許客戶端以相同鍵重試
+            IdempotencyKey.query.filter_by(id=record_id).delete()
+        else:
+            IdempotencyKey.query.filter_by(id=record_id).update({
+                'status_code': response.status_code,
+                'response_body': response.get_data(as_text=True),
+                'response_mimetype': response.mimetype
+            })
+        db.session.commit()
+        return response
+    return wrapper
+
+
+def purge_expired_keys(batch_size=1000):
+    """分批刪除過期的冪等鍵，返回刪除數量"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_TTL'])
+    deleted = 0
+    while True:
+        ids = [row[0] for row in db.session.query(IdempotencyKey.id).filter(
+            IdempotencyKey.created_at < cutoff
+        ).limit(batch_size)]
+        if not ids:
+            break
+        deleted += IdempotencyKey.query.filter(
+            IdempotencyKey.id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    return deleted
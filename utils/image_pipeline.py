@@ -0,0 +1,180 @@
+# 上傳圖片處理管線（原圖先落地，WebP 轉換交給進程池）
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from database import db
+from models import ProductImage, StoreImage
+from utils.image_utils import IMAGE_SIZES, encode_image, save_original_image
+
+# 圖片類型 -> (模型, 擁有者欄位)
+IMAGE_MODELS = {
+    'product': (ProductImage, 'product_id'),
+    'store': (StoreImage, 'store_id'),
+}
+IMAGE_KINDS = {model: kind for kind, (model, _) in IMAGE_MODELS.items()}
+
+
+def finish_image(kind, image_id, webp_path):
+    """寫回轉換結果：成功時啟用圖片，失敗時標記 failed（保留原圖以便重試）"""
+    model, _ = IMAGE_MODELS[kind]
+    image = db.session.get(model, image_id)
+    if image is None or image.status != 'pending':
+        # 處理期間圖片已被刪除，清理轉換結果
+        if webp_path and (image is None or image.image != webp_path):
+            _remove(webp_path)
+        return
+    if webp_path:
+        image.image = webp_path
+        image.status = 'ready'
+        image.is_active = True
+    else:
+        image.status = 'failed'
+    db.session.commit()
+
+
+def _remove(image_path):
+    try:
+        os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], image_path))
+    except OSError:
+        pass
+
+
+class SyncImagePipeline:
+    """在當前進程中同步轉換（測試與命令行使用）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def submit(self, kind, image_id, image_path):
+        upload_folder = os.path.abspath(self.app.config['UPLOAD_FOLDER'])
+        finish_image(kind, image_id, encode_image(upload_folder, image_path, IMAGE_SIZES[kind]))
+        return True
+
+
+class ProcessImagePipeline:
+    """以有界進程池轉換圖片，請求只負責保存原圖
+
+    進程池在首次提交時建立（每個 worker 進程各自一個），
+    最多 max_pending 個任務排隊，超出時圖片保持 pending，由定時執行的命令行補處理。
+    gthread worker 為多線程進程，子進程以 spawn 啟動，不複製 fork 時其他線程持有的鎖。
+    """
+
+    def __init__(self, app, workers, max_pending):
+        self.app = app
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def submit(self, kind, image_id, image_path):
+        """提交轉換任務，佇列已滿時返回 False"""
+        if not self._slots.acquire(blocking=False):
+            return False
+        upload_folder = os.path.abspath(self.app.config['UPLOAD_FOLDER'])
+        executor = self._get_executor()
+        try:
+            future = executor.submit(encode_image, upload_folder, image_path, IMAGE_SIZES[kind])
+        except (BrokenProcessPool, RuntimeError):
+            self._slots.release()
+            self._reset(executor)
+            return False
+        future.add_done_callback(lambda done: self._done(executor, kind, image_id, done))
+        return True
+
+    def _done(self, executor, kind, image_id, future):
+        # 在進程池的管理線程中執行
+        self._slots.release()
+        try:
+            webp_path = future.result()
+        except BrokenProcessPool:
+            # 子進程異常退出，下次提交時重建進程池
+            self._reset(executor)
+            webp_path = None
+        except Exception:
+            webp_path = None
+        with self.app.app_context():
+            try:
+                finish_image(kind, image_id, webp_path)
+            except Exception as e:
+                db.session.rollback()
+                print(f"圖片狀態更新錯誤: {e}")
+
+
+def add_pending_image(kind, owner_id, file, sort):
+    """保存原圖並新增 pending 圖片記錄（未提交），上傳無效時返回 None"""
+    image_path = save_original_image(file, kind, owner_id)
+    if not image_path:
+        return None
+    model, owner = IMAGE_MODELS[kind]
+    image = model(image=image_path, sort=sort, is_active=False, status='pending', **{owner: owner_id})
+    db.session.add(image)
+    return image
+
+
+def enqueue_images(images):
+    """提交後將 pending 圖片交給管線轉換，返回成功排隊的數量"""
+    pipeline = current_app.extensions['image_pipeline']
+    queued = 0
+    for image in images:
+        if pipeline.submit(IMAGE_KINDS[type(image)], image.id, image.image):
+            queued += 1
+    return queued
+
+
+def process_pending_images(min_age=600, retry_failed=False):
+    """同步處理遺留的 pending（及 failed）圖片，返回 (成功數, 失敗數)
+
+    只處理建立超過 min_age 秒的 pending 圖片，避免與進程池中的任務重複。
+    """
+    statuses = ('pending', 'failed') if retry_failed else ('pending',)
+    cutoff = datetime.utcnow() - timedelta(seconds=min_age)
+    upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    ready = failed = 0
+    for kind, (model, _) in IMAGE_MODELS.items():
+        rows = model.query.with_entities(model.id, model.image).filter(
+            model.status.in_(statuses),
+            db.or_(model.status == 'failed', model.created_at < cutoff)
+        ).order_by(model.id).all()
+        for image_id, image_path in rows:
+            # failed 圖片先恢復為 pending，再與管線使用相同的寫回邏輯
+            model.query.filter_by(id=image_id).update({'status': 'pending'})
+            webp_path = encode_image(upload_folder, image_path, IMAGE_SIZES[kind])
+            finish_image(kind, image_id, webp_path)
+            if webp_path:
+                ready += 1
+            else:
+                failed += 1
+    return ready, failed
+
+
+def init_image_pipeline(app):
+    """初始化圖片處理管線"""
+    backend = app.config.get('IMAGE_PIPELINE', 'process')
+    if backend == 'process':
+        pipeline = ProcessImagePipeline(app, app.config.get('IMAGE_WORKERS', 2),
+                                        app.config.get('IMAGE_QUEUE_SIZE', 32))
+    elif backend == 'sync':
+        pipeline = SyncImagePipeline(app)
+    else:
+        raise ValueError(f'未知的圖片處理管線: {backend}')
+    app.extensions['image_pipeline'] = pipeline
@@ -38,43 +38,14 @@ def resize_and_convert_to_webp(file_path, max_size=(800, 800), quality=85):
         print(f"圖片處理錯誤: {e}")
         return None
 
-def save_product_image(file, product_id):
-    """保存商品圖片到 static/uploads/product/{product_id}/ 目錄"""
-    if not file or not allowed_file(file.filename):
-        return None
-    
-    # 生成唯一文件名
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    unique_id = str(uuid.uuid4())[:8]
-    original_ext = file.filename.rsplit('.', 1)[1].lower()
-    temp_filename = f"{timestamp}_{unique_id}.{original_ext}"
-    
-    # 創建上傳目錄 static/uploads/product/{product_id}/
-    upload_folder = os.path.join(
-        current_app.config['UPLOAD_FOLDER'],
-        'product',
-        str(product_id)
-    )
-    os.makedirs(upload_folder, exist_ok=True)
-    
-    # 完整的文件路徑
-    temp_file_path = os.path.join(upload_folder, temp_filename)
-    
-    # 保存文件
-    file.save(temp_file_path)
-    
-    # 轉換為 WebP 格式
-    webp_path = resize_and_convert_to_webp(temp_file_path)
-    
-    if webp_path:
-        # 返回相對路徑 product/{product_id}/filename.webp (使用 / 而非 os.path.join 以確保 URL 路徑正確)
-        webp_filename = os.path.basename(webp_path)
-        return f"product/{product_id}/{webp_filename}"
-    
-    return None
+# 圖片類型 -> 最大尺寸（店鋪 banner 尺寸更大）
+IMAGE_SIZES = {
+    'product': (800, 800),
+    'store': (1200, 600),
+}
 
-def save_store_image(file, store_id):
-    """保存店鋪圖片到 static/uploads/store/{store_id}/ 目錄"""
+def save_original_image(file, kind, owner_id):
+    """保存上傳原圖到 static/uploads/{kind}/{owner_id}/ 目錄，返回相對路徑"""
     if not file or not allowed_file(file.filename):
         return None
     
@@ -82,30 +53,26 @@ def save_store_image(file, store_id):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     unique_id = str(uuid.uuid4())[:8]
     original_ext = file.filename.rsplit('.', 1)[1].lower()
-    temp_filename = f"{timestamp}_{unique_id}.{original_ext}"
+    filename = f"{timestamp}_{unique_id}.{original_ext}"
     
-    # 創建上傳目錄 static/uploads/store/{store_id}/
-    upload_folder = os.path.join(
-        current_app.config['UPLOAD_FOLDER'],
-        'store',
-        str(store_id)
-    )
+    # 創建上傳目錄
+    upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], kind, str(owner_id))
     os.makedirs(upload_folder, exist_ok=True)
     
-    # 完整的文件路徑
-    temp_file_path = os.path.join(upload_folder, temp_filename)
-    
     # 保存文件
-    file.save(temp_file_path)
-    
-    # 轉換為 WebP 格式
-    webp_path = resize_and_convert_to_webp(temp_file_path, max_size=(1200, 600))  # banner 尺寸更大
+    file.save(os.path.join(upload_folder, filename))
     
+    # 使用 / 而非 os.path.join 以確保 URL 路徑正確
+    return f"{kind}/{owner_id}/{filename}"
+
+def encode_image(upload_folder, image_path, max_size):
+    """將原圖轉換為 WebP，返回 WebP 的相對路徑，失敗返回 None
+
+    不依賴應用上下文，可在進程池中執行。
+    """
+    webp_path = resize_and_convert_to_webp(os.path.join(upload_folder, image_path), max_size=max_size)
     if webp_path:
-        # 返回相對路徑 store/{store_id}/filename.webp
-        webp_filename = os.path.basename(webp_path)
-        return f"store/{store_id}/{webp_filename}"
-    
+        return f"{os.path.dirname(image_path)}/{os.path.basename(webp_path)}"
     return None
 
 def delete_product_image(image_path):
@@ -0,0 +1,112 @@
+# 本地鍵值存儲（帶過期時間）
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemoryKVStore:
+    """進程內鍵值存儲（開發與測試用）"""
+
+    def __init__(self):
+        self._data = {}  # key -> (expires_at, value)
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """讀取值，不存在或已過期時返回 None"""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.time():
+            return None
+        return json.loads(entry[1])
+
+    def set(self, key, value, ttl):
+        """寫入值並設置過期秒數"""
+        with self._lock:
+            self._data[key] = (time.time() + ttl, json.dumps(value))
+
+    def delete(self, key):
+        """刪除鍵"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def update(self, key, func, ttl):
+        """原子地讀取、修改並寫回；func 接收舊值（或 None）並返回新值"""
+        with self._lock:
+            value = func(self.get(key))
+            self.set(key, value, ttl)
+            return value
+
+    def purge_expired(self, limit=1000):
+        """刪除已過期的鍵，返回刪除數量"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._data.items() if entry[0] < now][:limit]
+            for key in expired:
+                del self._data[key]
+        return len(expired)
+
+
+class SQLiteKVStore:
+    """基於 SQLite WAL 模式的鍵值存儲，多個 worker 可共享同一文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS kv ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_kv_expires_at ON kv (expires_at)')
+
+    def _connect(self):
+        """每個進程、每個線程使用獨立連接（fork 後不可共用）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """讀取值，不存在或已過期時返回 None"""
+        row = self._connect().execute(
+            'SELECT value FROM kv WHERE key = ? AND expires_at >= ?', (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        """寫入值並設置過期秒數"""
+        self._connect().execute(
+            'INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, json.dumps(value), time.time() + ttl)
+        )
+
+    def delete(self, key):
+        """刪除鍵"""
+        self._connect().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+    def update(self, key, func, ttl):
+        """原子地讀取、修改並寫回；func 接收舊值（或 None）並返回新值"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            value = func(self.get(key))
+            self.set(key, value, ttl)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def purge_expired(self, limit=1000):
+        """分批刪除已過期的鍵，返回刪除數量"""
+        cursor = self._connect().execute(
+            'DELETE FROM kv WHERE key IN (SELECT key FROM kv WHERE expires_at < ? LIMIT ?)',
+            (time.time(), limit)
+        )
+        return cursor.rowcount
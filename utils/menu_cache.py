@@ -0,0 +1,287 @@
+# 菜單快照快取
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows：僅有進程內互斥
+    fcntl = None
+
+from flask import current_app, has_app_context
+from sqlalchemy import case, event, insert
+from sqlalchemy.orm import Session, selectinload
+
+from database import db
+from models import Product, ProductChange
+
+# 會影響菜單內容的模型（門市頁面同樣依賴此版本號）
+CATALOG_MODELS = ('Product', 'ProductImage', 'ProductIngredient', 'Store', 'StoreImage')
+
+# 變更日誌的提交寬限（秒）：增量游標只推進到此時間之前寫入的日誌
+COMMIT_GRACE = 10
+
+
+class MenuSnapshot:
+    """序列化後的菜單快照"""
+
+    __slots__ = ('version', 'products', 'details', 'products_json', 'details_json')
+
+    def __init__(self, version, products, details, products_json, details_json):
+        self.version = version
+        self.products = products            # 列表格式（/api/products）
+        self.details = details              # product_id -> 詳情格式
+        self.products_json = products_json  # 預先編碼的列表 JSON
+        self.details_json = details_json    # product_id -> 預先編碼的詳情 JSON
+
+    def get_product(self, product_id):
+        """獲取產品詳情（不存在或已下架時返回 None）"""
+        return self.details.get(product_id)
+
+    def __repr__(self):
+        return f'<MenuSnapshot v{self.version} products={len(self.products)}>'
+
+
+def serialize_product(product, include_ingredients=False):
+    """將產品序列化為 API 格式"""
+    data = {
+        'id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'special_price': float(product.special_price),
+        'cold_price': float(product.cold_price),
+        'hot_price': float(product.hot_price),
+        'description': product.description,
+        'images': [img.image for img in product.images if img.is_active]
+    }
+    if include_ingredients:
+        data['ingredients'] = [{
+            'id': ing.id,
+            'name': ing.name,
+            'price': float(ing.price)
+        } for ing in product.ingredients if ing.is_active]
+    return data
+
+
+def _state():
+    """獲取當前應用的快取狀態"""
+    return current_app.extensions['menu_cache']
+
+
+def current_version():
+    """獲取當前菜單版本號（跨 worker 共享）"""
+    try:
+        with open(_state()['version_file']) as f:
+            return int(f.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def invalidate_menu():
+    """使菜單快照失效，所有 worker 在下次讀取時重建"""
+    state = _state()
+    path = state['version_file']
+    with state['lock']:
+        try:
+            with open(path + '.lock', 'w') as lock:
+                # 跨進程互斥遞增；版本號寫入文件內容而非依賴 mtime（mtime 精度不足以區分連續失效）
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # 版本文件不存在時以當前時間起算，重建文件後不會重複使用舊版本號（ETag）
+                version = (current_version() or time.time_ns()) + 1
+                temp_path = f'{path}.{os.getpid()}.tmp'
+                with open(temp_path, 'w') as f:
+                    f.write(str(version))
+                os.replace(temp_path, path)
+        except OSError as e:
+            print(f"菜單版本更新錯誤: {e}")
+            version = current_version()
+        state['snapshot'] = None
+    return version
+
+
+def _build_snapshot(version):
+    """從資料庫建立菜單快照"""
+    products = Product.query.options(
+        selectinload(Product.images),
+        selectinload(Product.ingredients)
+    ).filter_by(is_active=True).order_by(Product.id).all()
+
+    dumps = current_app.json.dumps
+    listing = [serialize_product(p) for p in products]
+    details = {p.id: serialize_product(p, include_ingredients=True) for p in products}
+    return MenuSnapshot(
+        version=version,
+        products=listing,
+        details=details,
+        products_json=dumps(listing),
+        details_json={product_id: dumps(data) for product_id, data in details.items()}
+    )
+
+
+def get_menu_snapshot():
+    """獲取菜單快照（版本未變時直接返回快取）"""
+    state = _state()
+    version = current_version()
+    snapshot = state['snapshot']
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with state['lock']:
+        snapshot = state['snapshot']
+        if snapshot is None or snapshot.version != version:
+            snapshot = _build_snapshot(version)
+            state['snapshot'] = snapshot
+    return snapshot
+
+
+def _touches_catalog(session):
+    """檢查本次 flush 是否修改了菜單相關模型"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if type(obj).__name__ in CATALOG_MODELS:
+            return True
+    return False
+
+
+def _product_changes(session):
+    """收集本次 flush 中變更的產品 ID 及動作"""
+    changes = {}
+    for obj in (*session.new, *session.dirty):
+        name = type(obj).__name__
+        if name == 'Product':
+            changes[obj.id] = 'remove' if obj.is_active is False else 'upsert'
+        elif name in ('ProductImage', 'ProductIngredient') and obj.product_id:
+            changes.setdefault(obj.product_id, 'upsert')
+    for obj in session.deleted:
+        name = type(obj).__name__
+        if name == 'Product':
+            changes[obj.id] = 'remove'
+        elif name in ('ProductImage', 'ProductIngredient') and obj.product_id:
+            changes.setdefault(obj.product_id, 'upsert')
+    return changes
+
+
+def _after_flush(session, flush_context):
+    if not _touches_catalog(session):
+        return
+    session.info['menu_dirty'] = True
+
+    # 在同一交易中寫入變更日誌
+    changes = _product_changes(session)
+    if changes:
+        now = datetime.utcnow()
+        session.connection().execute(insert(ProductChange), [
+            {'product_id': product_id, 'action': action, 'changed_at': now}
+            for product_id, action in changes.items()
+        ])
+
+
+def product_changes_window(grace=COMMIT_GRACE):
+    """返回 (最舊日誌ID, 可發布的游標)
+
+    ID 在寫入時分配、提交可能較晚：較小的 ID 可能在較大的 ID 之後才可見。
+    游標只推進到 grace 秒前寫入的日誌，且不越過最近寫入中最小的 ID，
+    晚提交的變更不會落在客戶端游標之後。
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    oldest, settled, recent = db.session.query(
+        db.func.min(ProductChange.id),
+        db.func.max(case((ProductChange.changed_at < cutoff, ProductChange.id))),
+        db.func.min(case((ProductChange.changed_at >= cutoff, ProductChange.id)))
+    ).one()
+    cursor = settled or 0
+    if recent is not None:
+        cursor = min(cursor, recent - 1)
+    return oldest, cursor
+
+
+def get_product_changes(since, window=None):
+    """獲取游標之後變更的產品，返回 (新游標, 更新列表, 下架 ID 列表, 是否需要全量重同步)
+
+    since 之後的日誌已被清理時無法計算增量，返回全部上架產品並要求客戶端重建本地資料。
+    window 為 product_changes_window() 的結果（呼叫方已讀取時傳入）。
+    """
+    # 先讀游標再讀資料：期間的新變更會在下次同步重複送出，而不會遺漏
+    oldest, cursor = window or product_changes_window()
+    query = Product.query.options(
+        selectinload(Product.images),
+        selectinload(Product.ingredients)
+    ).filter_by(is_active=True).order_by(Product.id)
+    resync = bool(since) and oldest is not None and since < oldest - 1
+    if not since or resync:
+        return cursor, [serialize_product(p, include_ingredients=True) for p in query], [], resync
+    if since >= cursor:
+        return since, [], [], False
+
+    changed_ids = {row[0] for row in db.session.query(ProductChange.product_id).filter(
+        ProductChange.id > since,
+        ProductChange.id <= cursor
+    ).distinct()}
+    if not changed_ids:
+        return cursor, [], [], False
+
+    updated = [serialize_product(p, include_ingredients=True)
+               for p in query.filter(Product.id.in_(changed_ids))]
+    removed = sorted(changed_ids - {item['id'] for item in updated})
+    return cursor, updated, removed, False
+
+
+def purge_product_changes(max_age=None, batch_size=1000):
+    """分批刪除超過 max_age 秒的變更日誌，返回刪除數量
+
+    保留ID最大的一筆，避免游標歸零或（SQLite）ID被重複使用。
+    """
+    if max_age is None:
+        max_age = current_app.config['PRODUCT_CHANGES_RETENTION']
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    newest_id = db.session.query(db.func.max(ProductChange.id)).scalar()
+    if newest_id is None:
+        return 0
+    deleted = 0
+    while True:
+        ids = [row[0] for row in db.session.query(ProductChange.id).filter(
+            ProductChange.changed_at < cutoff,
+            ProductChange.id < newest_id
+        ).order_by(ProductChange.id).limit(batch_size)]
+        if not ids:
+            break
+        deleted += ProductChange.query.filter(
+            ProductChange.id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    return deleted
+
+
+def _after_commit(session):
+    if session.info.pop('menu_dirty', False) and has_app_context() \
+            and 'menu_cache' in current_app.extensions:
+        invalidate_menu()
+
+
+def _after_rollback(session):
+    session.info.pop('menu_dirty', None)
+
+
+_listeners_registered = False
+
+
+def init_menu_cache(app):
+    """初始化菜單快取"""
+    global _listeners_registered
+
+    version_file = app.config.get('MENU_VERSION_FILE') or \
+        os.path.join(app.instance_path, 'menu.version')
+    os.makedirs(os.path.dirname(version_file), exist_ok=True)
+    app.extensions['menu_cache'] = {
+        'version_file': version_file,
+        'snapshot': None,
+        'lock': threading.Lock()
+    }
+
+    if not _listeners_registered:
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+        _listeners_registered = True
+
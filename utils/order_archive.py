@@ -0,0 +1,67 @@
+# 訂單歸檔（冷熱分離）
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, insert, literal, select
+
+from database import db
+from models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+# 只歸檔終態訂單，歸檔後不會再有狀態轉換
+ARCHIVABLE_STATUSES = ('completed', 'cancelled')
+
+# 報表與匯出需同時讀取的 (訂單, 訂單項目) 表
+ORDER_TABLES = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+
+ORDER_COLUMNS = [column.name for column in ArchivedOrder.__table__.columns if column.name != 'archived_at']
+ITEM_COLUMNS = [column.name for column in ArchivedOrderItem.__table__.columns]
+
+
+def find_order(order_id):
+    """依ID查找訂單，不在線上表時查詢歸檔表"""
+    return db.session.get(Order, order_id) or db.session.get(ArchivedOrder, order_id)
+
+
+def archive_orders(max_age=None, batch_size=500, now=None):
+    """分批將超過 max_age 秒的已完成 / 已取消訂單移入歸檔表，返回 (訂單數, 項目數)
+
+    每批在同一交易中複製並刪除，獨立提交以避免長時間鎖表。
+    """
+    max_age = max_age if max_age is not None else current_app.config['ORDER_ARCHIVE_AFTER']
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=max_age)
+    orders = Order.__table__
+    items = OrderItem.__table__
+
+    # 保留ID最大的訂單：SQLite（及舊版 MySQL 重啟後）會以現存最大ID + 1 分配新ID，
+    # 刪除最大ID會導致新訂單與歸檔訂單ID重複
+    newest_id = db.session.query(func.max(Order.id)).scalar()
+    if newest_id is None:
+        return 0, 0
+
+    moved_orders = moved_items = 0
+    while True:
+        ids = [row[0] for row in db.session.execute(
+            select(orders.c.id).where(
+                orders.c.status.in_(ARCHIVABLE_STATUSES),
+                orders.c.created_at < cutoff,
+                orders.c.id < newest_id
+            ).order_by(orders.c.id).limit(batch_size)
+        )]
+        if not ids:
+            break
+
+        db.session.execute(insert(ArchivedOrder).from_select(
+            ORDER_COLUMNS + ['archived_at'],
+            select(*[orders.c[name] for name in ORDER_COLUMNS],
+                   literal(now, db.DateTime)).where(orders.c.id.in_(ids))
+        ))
+        db.session.execute(insert(ArchivedOrderItem).from_select(
+            ITEM_COLUMNS,
+            select(*[items.c[name] for name in ITEM_COLUMNS]).where(items.c.order_id.in_(ids))
+        ))
+        moved_items += db.session.execute(items.delete().where(items.c.order_id.in_(ids))).rowcount
+        moved_orders += db.session.execute(orders.delete().where(orders.c.id.in_(ids))).rowcount
+        db.session.commit()
+
+    return moved_orders, moved_items
@@ -0,0 +1,275 @@
+# 訂單狀態即時推送（Server-Sent Events）
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context, request, stream_with_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import db
+from models import OrderEvent
+
+HEARTBEAT_INTERVAL = 15   # 心跳間隔（秒），避免代理關閉閒置連接
+RETRY_INTERVAL = 3000     # 客戶端重連間隔（毫秒）
+SUBSCRIPTION_BUFFER = 500
+# MySQL / PostgreSQL 的自增ID可能亂序提交：游標推進後，較小ID的事件仍可能在此秒數內提交，
+# 讀取時重讀這段時間內的事件並依ID去重
+COMMIT_GRACE = 10
+
+
+class Subscription:
+    """單個 SSE 連接的訂閱；user_id 為 None 時接收所有訂單事件"""
+
+    def __init__(self, broker, user_id=None):
+        self.broker = broker
+        self.user_id = user_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=SUBSCRIPTION_BUFFER)
+
+    def matches(self, data):
+        return self.user_id is None or data['user_id'] == self.user_id
+
+    def put(self, data):
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            # 消費過慢：結束連接，由客戶端以 Last-Event-ID 重連補發
+            self.overflowed = True
+
+    def get(self, timeout):
+        """等待下一個事件，逾時返回 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class MemoryEventBroker:
+    """進程內發布訂閱：事件在提交後直接分發（單進程部署與測試用）"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id=None):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, events):
+        """分發事件給符合條件的訂閱者"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for data in events:
+            for subscription in subscribers:
+                if subscription.matches(data):
+                    subscription.put(data)
+
+    def committed(self, events):
+        """本進程提交了新事件"""
+        self.publish(events)
+
+
+class DatabaseEventBroker(MemoryEventBroker):
+    """跨 worker 發布訂閱：每個進程一個輪詢線程讀取 order_events 表並分發給本地訂閱者
+
+    輪詢查詢數與連接數無關，只在有訂閱者時執行。
+    """
+
+    def __init__(self, app, interval=1.0):
+        super().__init__()
+        self.app = app
+        self.interval = interval
+        self._pid = None
+        self._cursor = None  # 輪詢游標，無人訂閱時為 None
+        self._seen = {}      # 事件ID -> 分發時間，用於寬限期內重讀事件的去重
+
+    def committed(self, events):
+        # 由輪詢線程統一分發，本進程與其他進程的事件順序一致
+        pass
+
+    def subscribe(self, user_id=None):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            # fork 後線程不會被繼承，需在子進程中重新啟動
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._cursor = None
+                threading.Thread(target=self._poll, name='order-events', daemon=True).start()
+            if self._cursor is None:
+                # 在註冊訂閱者之前確定游標：之後提交的事件都由輪詢分發，
+                # 而不會在第一次輪詢時被當作已讀略過
+                self._cursor = latest_event_id()
+                now = time.monotonic()
+                self._seen = {data['id']: now for data in events_since(self._cursor)}
+            self._subscribers.add(subscription)
+        return subscription
+
+    def _poll(self):
+        with self.app.app_context():
+            while True:
+                time.sleep(self.interval)
+                with self._lock:
+                    if not self._subscribers:
+                        # 無人訂閱時不查詢，下一個訂閱者重新確定游標
+                        self._cursor = None
+                        continue
+                    cursor = self._cursor
+                try:
+                    now = time.monotonic()
+                    seen = self._seen
+                    events = [data for data in events_since(cursor) if data['id'] not in seen]
+                    if events:
+                        cursor = max(cursor, events[-1]['id'])
+                        for data in events:
+                            seen[data['id']] = now
+                        self.publish(events)
+                    with self._lock:
+                        # 游標只在有訂閱者時推進，重設只發生在本線程
+                        self._cursor = cursor
+                        self._seen = {event_id: at for event_id, at in seen.items()
+                                      if now - at < 2 * COMMIT_GRACE}
+                except Exception:
+                    current_app.logger.exception('讀取訂單事件失敗')
+                finally:
+                    db.session.remove()
+
+
+def record_order_event(order_id, user_id, status, version):
+    """在當前交易中記錄訂單狀態事件，提交後推送"""
+    db.session.add(OrderEvent(order_id=order_id, user_id=user_id, status=status, version=version))
+
+
+def latest_event_id():
+    return db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+
+
+def events_since(cursor, user_id=None, limit=500, grace=COMMIT_GRACE):
+    """獲取游標之後的事件（斷線補發），按ID排序
+
+    另外返回最近 grace 秒內建立、ID不大於游標的事件（亂序提交），呼叫方需依ID去重。
+    """
+    query = OrderEvent.query
+    if user_id is not None:
+        query = query.filter(OrderEvent.user_id == user_id)
+    events = query.filter(OrderEvent.id > cursor).order_by(OrderEvent.id).limit(limit).all()
+    if grace:
+        events += query.filter(
+            OrderEvent.id <= cursor,
+            OrderEvent.created_at >= datetime.utcnow() - timedelta(seconds=grace)
+        ).all()
+    return [e.to_dict() for e in sorted(events, key=lambda e: e.id)]
+
+
+def purge_order_events(max_age, batch_size=1000):
+    """分批刪除超過 max_age 秒的事件，返回刪除數量"""
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    deleted = 0
+    while True:
+        ids = [row[0] for row in db.session.query(OrderEvent.id).filter(
+            OrderEvent.created_at < cutoff
+        ).limit(batch_size)]
+        if not ids:
+            break
+        deleted += OrderEvent.query.filter(
+            OrderEvent.id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    return deleted
+
+
+def _format(data):
+    payload = {key: data[key] for key in ('order_id', 'status', 'version')}
+    return f"id: {data['id']}\nevent: order_status\ndata: {json.dumps(payload)}\n\n"
+
+
+def order_event_stream(user_id=None):
+    """SSE 響應：推送訂單狀態變化，支援 Last-Event-ID 斷線補發"""
+    broker = current_app.extensions['order_events']
+    timeout = current_app.config.get('ORDER_STREAM_TIMEOUT', 25)
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
+
+    def generate():
+        # 先訂閱再補發，避免兩者之間的事件遺失
+        subscription = broker.subscribe(user_id)
+        try:
+            yield f'retry: {RETRY_INTERVAL}\n\n'
+            delivered = set()
+            if last_event_id is not None:
+                for data in events_since(last_event_id, user_id):
+                    delivered.add(data['id'])
+                    yield _format(data)
+            # 長連接期間不佔用資料庫連接
+            db.session.remove()
+
+            # 連接定時結束，由客戶端自動重連，避免 worker 線程被永久佔用
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and not subscription.overflowed:
+                data = subscription.get(timeout=min(HEARTBEAT_INTERVAL, timeout))
+                if data is None:
+                    yield ': keep-alive\n\n'
+                elif data['id'] not in delivered:
+                    delivered.add(data['id'])
+                    yield _format(data)
+        finally:
+            subscription.close()
+
+    response = current_app.response_class(stream_with_context(generate()),
+                                          mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 關閉 nginx 緩衝
+    return response
+
+
+def _after_flush(session, flush_context):
+    events = [obj.to_dict() for obj in session.new if isinstance(obj, OrderEvent)]
+    if events:
+        session.info.setdefault('order_events', []).extend(events)
+
+
+def _after_commit(session):
+    events = session.info.pop('order_events', None)
+    if events and has_app_context() and 'order_events' in current_app.extensions:
+        current_app.extensions['order_events'].committed(events)
+
+
+def _after_rollback(session):
+    session.info.pop('order_events', None)
+
+
+_listeners_registered = False
+
+
+def init_order_events(app):
+    """初始化訂單事件推送"""
+    global _listeners_registered
+
+    backend = app.config.get('ORDER_EVENT_BROKER', 'database')
+    if backend == 'memory':
+        broker = MemoryEventBroker()
+    elif backend == 'database':
+        broker = DatabaseEventBroker(app, app.config.get('ORDER_EVENT_POLL_INTERVAL', 1.0))
+    else:
+        raise ValueError(f'未知的訂單事件推送方式: {backend}')
+    app.extensions['order_events'] = broker
+
+    if not _listeners_registered:
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+        _listeners_registered = True
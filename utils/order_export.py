@@ -0,0 +1,133 @@
+# 訂單串流匯出（CSV / JSONL）
+import csv
+import io
+import json
+
+from sqlalchemy import select, union_all
+
+from database import db
+from utils.order_archive import ORDER_TABLES
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+ORDER_COLUMNS = ('id', 'order_number', 'created_at', 'status', 'customer_name', 'customer_phone',
+                 'customer_email', 'payment_method', 'payment_status', 'total_amount', 'notes')
+ITEM_COLUMNS = ('product_id', 'product_name', 'product_price', 'quantity', 'temperature',
+                'ingredients', 'line_total')
+BATCH_SIZE = 1000
+CSV_FLUSH_ROWS = 500
+
+
+def _export_select(order_model, item_model, start, end, statuses):
+    query = select(
+        *[getattr(order_model, column).label(column) for column in ORDER_COLUMNS],
+        *[getattr(item_model, column).label(f'item_{column}') for column in ITEM_COLUMNS],
+        item_model.id.label('item_sort')
+    ).outerjoin(item_model, item_model.order_id == order_model.id)
+    if start:
+        query = query.where(order_model.created_at >= start)
+    if end:
+        query = query.where(order_model.created_at < end)
+    if statuses:
+        query = query.where(order_model.status.in_(statuses))
+    return query
+
+
+def _export_query(start=None, end=None, statuses=None):
+    """線上與歸檔訂單合併（UNION ALL）後依 (created_at, id, 項目ID) 排序"""
+    rows = union_all(*[
+        _export_select(order_model, item_model, start, end, statuses)
+        for order_model, item_model in ORDER_TABLES
+    ]).subquery()
+    return select(
+        *[rows.c[column] for column in ORDER_COLUMNS],
+        *[rows.c[f'item_{column}'] for column in ITEM_COLUMNS]
+    ).order_by(rows.c.created_at, rows.c.id, rows.c.item_sort)
+
+
+def iter_export_rows(start=None, end=None, statuses=None, batch_size=BATCH_SIZE):
+    """以伺服器端游標（yield_per）逐行讀取訂單與項目，每個項目一行"""
+    result = db.session.execute(
+        _export_query(start, end, statuses).execution_options(yield_per=batch_size)
+    )
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def _value(value):
+    """金額保留 Decimal 精度，時間輸出 ISO 格式"""
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+# 以這些字元開頭的儲存格會被試算表當作公式執行
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_value(value):
+    """CSV 儲存格：顧客輸入的文字以 ' 前綴避免公式注入，數值與時間保持原樣"""
+    text = _value(value)
+    if isinstance(value, str) and text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def export_csv(rows):
+    """CSV：每個訂單項目一行，訂單欄位重複；先輸出表頭，之後每 CSV_FLUSH_ROWS 行輸出一次"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([*ORDER_COLUMNS, *(f'item_{column}' for column in ITEM_COLUMNS)])
+    yield _drain(buffer)
+
+    pending = 0
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        pending += 1
+        if pending == CSV_FLUSH_ROWS:
+            yield _drain(buffer)
+            pending = 0
+    if pending:
+        yield _drain(buffer)
+
+
+def export_jsonl(rows):
+    """JSONL：每個訂單一行，項目為陣列；依排序相鄰分組，記憶體只保留一個訂單"""
+    current = None
+    for row in rows:
+        data = row._mapping
+        if current is None or current['id'] != data['id']:
+            if current is not None:
+                yield json.dumps(current, ensure_ascii=False) + '\n'
+            current = {column: _json_value(data[column]) for column in ORDER_COLUMNS}
+            current['items'] = []
+        if data['item_product_id'] is not None:
+            current['items'].append({
+                column: _json_value(data[f'item_{column}']) for column in ITEM_COLUMNS
+            })
+    if current is not None:
+        yield json.dumps(current, ensure_ascii=False) + '\n'
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (int, list, dict)):
+        return value
+    return _value(value)
+
+
+def export_orders(fmt, start=None, end=None, statuses=None, batch_size=BATCH_SIZE):
+    """返回逐段輸出匯出內容的生成器"""
+    rows = iter_export_rows(start, end, statuses, batch_size)
+    return export_csv(rows) if fmt == 'csv' else export_jsonl(rows)
@@ -0,0 +1,106 @@
+# 訂單號生成器
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import OrderSequence
+
+
+class RandomOrderNumberGenerator:
+    """隨機訂單號：ORD-YYYYMMDD-XXXXXXXX（舊格式）"""
+
+    def next(self):
+        return f"ORD-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+
+class SequenceOrderNumberGenerator:
+    """遞增訂單號：ORD-YYYYMMDD-NNNNNN
+
+    每個 worker 從 order_sequences 表一次預留 block_size 個號碼，之後在進程內
+    遞增發號，同一天的訂單號大致按時間排序，唯一索引的插入集中在 B-tree 尾端。
+    """
+
+    def __init__(self, block_size=20):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._day = None
+        self._next = self._end = 0
+        self._pid = None
+
+    def _reserve_block(self, conn, day):
+        """原子地預留一段號碼，返回區塊起始值"""
+        table = OrderSequence.__table__
+        for _ in range(3):
+            result = conn.execute(
+                update(table).where(table.c.day == day)
+                .values(next_value=table.c.next_value + self.block_size)
+            )
+            if result.rowcount:
+                end = conn.execute(select(table.c.next_value).where(table.c.day == day)).scalar()
+                return end - self.block_size
+            try:
+                # 當天第一個區塊（savepoint 內執行，衝突時不影響外層交易）
+                with conn.begin_nested():
+                    conn.execute(insert(table).values(day=day, next_value=1 + self.block_size))
+                return 1
+            except IntegrityError:
+                continue  # 其他 worker 同時建立了當天記錄
+        raise RuntimeError('無法預留訂單流水號')
+
+    def _discard(self, *args):
+        with self._lock:
+            self._day = None
+
+    def _allocate(self, day):
+        if db.engine.dialect.name == 'sqlite':
+            # SQLite 本身只允許單一寫入者，直接在當前交易中預留；
+            # 交易回滾時預留也被撤銷，需丟棄進程內的區塊避免重複發號
+            event.listen(db.session(), 'after_rollback', self._discard, once=True)
+            return self._reserve_block(db.session.connection(), day)
+        # 使用獨立的短交易，避免結帳期間一直鎖住序列行
+        with db.engine.begin() as conn:
+            return self._reserve_block(conn, day)
+
+    def next(self):
+        day = datetime.now().strftime('%Y%m%d')
+        with self._lock:
+            # fork 後子進程不可沿用父進程的區塊
+            if self._day != day or self._next >= self._end or self._pid != os.getpid():
+                self._next = self._allocate(day)
+                self._end = self._next + self.block_size
+                self._day = day
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+        return f'ORD-{day}-{value:06d}'
+
+
+GENERATORS = {
+    'random': RandomOrderNumberGenerator,
+    'sequence': SequenceOrderNumberGenerator
+}
+
+
+def next_order_number():
+    """生成下一個訂單號；無應用上下文時使用隨機格式"""
+    if not has_app_context() or 'order_numbers' not in current_app.extensions:
+        return RandomOrderNumberGenerator().next()
+    return current_app.extensions['order_numbers'].next()
+
+
+def init_order_numbers(app):
+    """初始化訂單號生成器"""
+    name = app.config.get('ORDER_NUMBER_GENERATOR', 'sequence')
+    if name not in GENERATORS:
+        raise ValueError(f'未知的訂單號生成器: {name}')
+    if name == 'sequence':
+        generator = SequenceOrderNumberGenerator(app.config.get('ORDER_NUMBER_BLOCK_SIZE', 20))
+    else:
+        generator = GENERATORS[name]()
+    app.extensions['order_numbers'] = generator
@@ -0,0 +1,85 @@
+# 訂單列表查詢
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, ProductImage
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def encode_cursor(order):
+    """以 (created_at, id) 作為游標"""
+    return f'{order.created_at.isoformat()}_{order.id}'
+
+
+def decode_cursor(cursor):
+    """解析游標，無效時返回 None"""
+    try:
+        created_at, order_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _page(query, model, cursor, limit):
+    """讀取游標之後的 limit + 1 筆訂單"""
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        created_at, order_id = position
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < order_id)
+        ))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+
+
+def paginate_orders(query, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """依 (created_at, id) 倒序的游標分頁，返回 (訂單列表, 下一頁游標)
+
+    每頁只讀取 limit + 1 筆，與訂單總量無關。
+    """
+    orders = _page(query, Order, cursor, limit)
+    next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
+
+def paginate_user_orders(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """會員訂單記錄：線上表與歸檔表各讀取一頁後合併，返回 (訂單列表, 下一頁游標)
+
+    兩表使用同一游標，訂單ID不重複，合併結果與單表分頁一致。
+    """
+    orders = _page(Order.query.filter_by(user_id=user_id), Order, cursor, limit)
+    orders += _page(ArchivedOrder.query.filter_by(user_id=user_id), ArchivedOrder, cursor, limit)
+    orders.sort(key=lambda order: (order.created_at, order.id), reverse=True)
+    next_cursor = encode_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
+
+def load_order_items(orders):
+    """每個表一次查詢載入多筆訂單（含歸檔訂單）的項目，返回 order_id -> 項目列表"""
+    items = defaultdict(list)
+    for model, archived in ((OrderItem, False), (ArchivedOrderItem, True)):
+        order_ids = [order.id for order in orders if order.is_archived is archived]
+        if order_ids:
+            for item in model.query.filter(
+                model.order_id.in_(order_ids)
+            ).order_by(model.order_id, model.id):
+                items[item.order_id].append(item)
+    return items
+
+
+def load_product_thumbnails(product_ids):
+    """一次查詢獲取多個產品的第一張啟用圖片，返回 product_id -> 圖片"""
+    thumbnails = {}
+    product_ids = set(product_ids)
+    if product_ids:
+        for product_id, image in ProductImage.query.with_entities(
+            ProductImage.product_id, ProductImage.image
+        ).filter(
+            ProductImage.product_id.in_(product_ids),
+            ProductImage.is_active.is_(True)
+        ).order_by(ProductImage.product_id, ProductImage.sort, ProductImage.id):
+            thumbnails.setdefault(product_id, image)
+    return thumbnails
@@ -0,0 +1,137 @@
+# 訂單狀態轉換（樂觀並發控制）
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from database import db
+from models import Order
+from models.order import ORDER_STATUSES
+from utils.counters import increment_counters
+from utils.order_events import record_order_event
+from utils.sales_rollups import move_order_sales
+
+# 轉換結果
+UPDATED = 'updated'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'      # 狀態機不允許此轉換
+CONFLICT = 'conflict'    # 版本號已被其他請求更新
+
+
+class TransitionResult:
+    """單筆訂單的轉換結果"""
+
+    __slots__ = ('order_id', 'outcome', 'status', 'version')
+
+    def __init__(self, order_id, outcome, status=None, version=None):
+        self.order_id = order_id
+        self.outcome = outcome
+        self.status = status
+        self.version = version
+
+    @property
+    def ok(self):
+        return self.outcome == UPDATED
+
+    def to_dict(self):
+        return {
+            'id': self.order_id,
+            'result': self.outcome,
+            'order_status': self.status,
+            'version': self.version
+        }
+
+
+def _conditional_update(order_id, version, new_status):
+    """以 UPDATE ... WHERE version = ? 更新單筆訂單，不持有行鎖；返回是否由本交易更新"""
+    table = Order.__table__
+    result = db.session.execute(
+        update(table).where(
+            table.c.id == order_id,
+            table.c.version == version,
+            table.c.status.in_(Order.sources_for(new_status))
+        ).values(
+            status=new_status,
+            version=table.c.version + 1,
+            updated_at=datetime.utcnow()
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount == 1
+
+
+def transition_orders(targets, new_status):
+    """批量轉換訂單狀態
+
+    targets 為 (訂單ID, 期望版本號或 None) 的列表；未指定版本號時以讀取到的
+    當前版本為準。返回與 targets 同序的 TransitionResult 列表，調用方負責提交。
+    """
+    if new_status not in ORDER_STATUSES:
+        raise ValueError(f'未知的訂單狀態: {new_status}')
+
+    table = Order.__table__
+    order_ids = [order_id for order_id, _ in targets]
+    current = {row.id: row for row in db.session.execute(
+        select(table.c.id, table.c.user_id, table.c.status, table.c.version,
+               table.c.created_at, table.c.total_amount)
+        .where(table.c.id.in_(order_ids))
+    )}
+
+    sources = Order.sources_for(new_status)
+    results = {}
+    expected = {}
+    for order_id, version in targets:
+        row = current.get(order_id)
+        if row is None:
+            results[order_id] = TransitionResult(order_id, NOT_FOUND)
+        elif version is not None and version != row.version:
+            results[order_id] = TransitionResult(order_id, CONFLICT, row.status, row.version)
+        elif row.status not in sources:
+            results[order_id] = TransitionResult(order_id, INVALID, row.status, row.version)
+        else:
+            expected[order_id] = row.version
+
+    if expected:
+        # 逐筆更新並以影響行數判斷：重新讀取只能看到已提交的結果，
+        # 無法區分是本交易還是並發請求完成了同一轉換
+        changed = [order_id for order_id, version in expected.items()
+                   if _conditional_update(order_id, version, new_status)]
+        for order_id in changed:
+            version = expected[order_id] + 1
+            results[order_id] = TransitionResult(order_id, UPDATED, new_status, version)
+            record_order_event(order_id, current[order_id].user_id, new_status, version)
+        lost = [order_id for order_id in expected if order_id not in changed]
+        if lost:
+            after = {row.id: row for row in db.session.execute(
+                select(table.c.id, table.c.status, table.c.version).where(table.c.id.in_(lost))
+            )}
+            for order_id in lost:
+                row = after.get(order_id)
+                if row is None:
+                    results[order_id] = TransitionResult(order_id, NOT_FOUND)
+                else:
+                    results[order_id] = TransitionResult(order_id, CONFLICT, row.status, row.version)
+
+    # 條件更新不經過 ORM，待處理訂單數需在同一交易中手動調整
+    updated = [order_id for order_id, result in results.items() if result.ok]
+    pending_delta = (new_status == 'pending') * len(updated) - \
+        sum(current[order_id].status == 'pending' for order_id in updated)
+    increment_counters(db.session.connection(), {'pending_orders': pending_delta})
+    move_order_sales([
+        (order_id, current[order_id].created_at, current[order_id].status, new_status,
+         current[order_id].total_amount)
+        for order_id in updated
+    ])
+
+    # 已載入會話的訂單需重新讀取狀態與版本號
+    for order_id, result in results.items():
+        if result.ok:
+            order = db.session.identity_map.get(db.session.identity_key(Order, order_id))
+            if order is not None:
+                db.session.expire(order)
+
+    return [results[order_id] for order_id, _ in targets]
+
+
+def transition_order(order_id, new_status, version=None):
+    """轉換單筆訂單狀態，返回 TransitionResult，調用方負責提交"""
+    return transition_orders([(order_id, version)], new_status)[0]
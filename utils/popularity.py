@@ -0,0 +1,161 @@
+# 商品與配料熱度分析（分塊串流 + NumPy 向量化彙總）
+import json
+
+import numpy as np
+from sqlalchemy import Float, String, Text, select, type_coerce
+
+from database import db
+from models import Product, ProductIngredient
+from utils.order_archive import ORDER_TABLES
+
+CHUNK_SIZE = 50000
+TEMPERATURES = ('normal', 'cold', 'hot')
+_TEMPERATURE_CODES = {name: code for code, name in enumerate(TEMPERATURES)}
+
+
+class GroupSum:
+    """以 int64 鍵分組累加多個數值欄位；記憶體只與不同鍵的數量有關"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.keys = np.empty(0, dtype=np.int64)
+        self.sums = np.empty((len(columns), 0), dtype=np.float64)
+
+    def add(self, keys, *values):
+        """累加一個分塊（values 與 keys 等長）"""
+        if not len(keys):
+            return
+        keys = np.concatenate([self.keys, keys])
+        values = np.concatenate([self.sums, np.vstack(values).astype(np.float64)], axis=1)
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.sums = np.vstack([np.bincount(inverse, weights=column, minlength=len(self.keys))
+                               for column in values])
+
+    def get(self, column):
+        return self.sums[self.columns.index(column)]
+
+
+class OrderItemChunk:
+    """訂單項目的列式分塊；配料 JSON 在此展開一次"""
+
+    __slots__ = ('product_id', 'quantity', 'line_total', 'temperature',
+                 'ingredient_line', 'ingredient_id')
+
+    def __init__(self, rows):
+        product_id, quantity, line_total, temperature, ingredients = zip(*rows)
+        self.product_id = np.array(product_id, dtype=np.int64)
+        self.quantity = np.array(quantity, dtype=np.int64)
+        self.line_total = np.array(line_total, dtype=np.float64)
+        self.temperature = np.array([_TEMPERATURE_CODES.get(t, 0) for t in temperature], dtype=np.int64)
+
+        # 整個分塊的配料 JSON 以一次 json.loads 解析（驅動已解析時重新編碼），
+        # 再展開為每個 (項目, 配料) 一行；舊資料只存 ID，新資料存 {id, name, price}
+        parsed = json.loads('[' + ','.join(
+            (text if isinstance(text, str) else json.dumps(text)) if text else 'null'
+            for text in ingredients
+        ) + ']')
+        ingredient_line, ingredient_id = [], []
+        for index, chosen in enumerate(parsed):
+            for ingredient in chosen or ():
+                ingredient_line.append(index)
+                ingredient_id.append(ingredient['id'] if isinstance(ingredient, dict) else ingredient)
+        self.ingredient_line = np.array(ingredient_line, dtype=np.int64)
+        self.ingredient_id = np.array(ingredient_id, dtype=np.int64)
+
+
+def stream_order_items(start=None, end=None, statuses=None, chunk_size=CHUNK_SIZE):
+    """分塊讀取訂單項目（含歸檔，依訂單建立時間與狀態篩選），逐塊返回 OrderItemChunk"""
+    # 直接以 Core 連接執行，不經過 ORM 的結果處理；yield_per 設在語句上：
+    # Connection.execution_options() 會就地修改會話的連接，之後的查詢也會分批串流
+    connection = db.session.connection()
+    for order_model, item_model in ORDER_TABLES:
+        query = _item_query(order_model, item_model, start, end, statuses)
+        for rows in connection.execute(query.execution_options(yield_per=chunk_size)).partitions():
+            yield OrderItemChunk(rows)
+
+
+def _item_query(order_model, item_model, start, end, statuses):
+    # 金額讀為浮點、溫度與配料讀為原始文本，跳過逐行的 Decimal、Enum 與 JSON 轉換
+    query = select(item_model.product_id, item_model.quantity,
+                   type_coerce(item_model.line_total, Float),
+                   type_coerce(item_model.temperature, String), type_coerce(item_model.ingredients, Text))
+    if start or end or statuses:
+        query = query.join(order_model, order_model.id == item_model.order_id)
+        if start:
+            query = query.where(order_model.created_at >= start)
+        if end:
+            query = query.where(order_model.created_at < end)
+        if statuses:
+            query = query.where(order_model.status.in_(statuses))
+    return query
+
+
+def _split(keys):
+    return keys >> 32, keys & 0xFFFFFFFF
+
+
+def popularity_report(start=None, end=None, statuses=None, limit=10, chunk_size=CHUNK_SIZE):
+    """熱銷商品、溫度分佈與配料附加率
+
+    附加率 = 含該配料的杯數 / 該商品的總杯數（以數量計）。
+    """
+    products = GroupSum(['units', 'lines', 'revenue'])
+    temperatures = GroupSum(['units'])
+    ingredients = GroupSum(['units'])
+
+    for chunk in stream_order_items(start, end, statuses, chunk_size):
+        products.add(chunk.product_id, chunk.quantity, np.ones_like(chunk.quantity), chunk.line_total)
+        temperatures.add(chunk.product_id * len(TEMPERATURES) + chunk.temperature, chunk.quantity)
+        if len(chunk.ingredient_id):
+            line_product = chunk.product_id[chunk.ingredient_line]
+            ingredients.add((line_product << 32) | chunk.ingredient_id,
+                            chunk.quantity[chunk.ingredient_line])
+
+    units = products.get('units')
+    order = np.lexsort((products.keys, -units))[:limit]
+    top_ids = products.keys[order]
+    units_by_product = dict(zip(products.keys.tolist(), units.tolist()))
+
+    # 溫度分佈（只回報熱銷商品）
+    mix = {int(pid): dict.fromkeys(TEMPERATURES, 0) for pid in top_ids}
+    temp_products, temp_codes = np.divmod(temperatures.keys, len(TEMPERATURES))
+    for pid, code, value in zip(temp_products.tolist(), temp_codes.tolist(),
+                                temperatures.get('units').tolist()):
+        if pid in mix:
+            mix[pid][TEMPERATURES[code]] = int(value)
+
+    # 配料附加率（只回報熱銷商品）
+    ing_products, ing_ids = _split(ingredients.keys)
+    selected = np.isin(ing_products, top_ids)
+    attach = {}
+    for pid, iid, value in zip(ing_products[selected].tolist(), ing_ids[selected].tolist(),
+                               ingredients.get('units')[selected].tolist()):
+        attach.setdefault(pid, []).append((iid, value))
+
+    names = dict(db.session.execute(
+        select(Product.id, Product.name).where(Product.id.in_(top_ids.tolist()))
+    ).all())
+    ingredient_names = dict(db.session.execute(
+        select(ProductIngredient.id, ProductIngredient.name)
+        .where(ProductIngredient.id.in_(ing_ids[selected].tolist()))
+    ).all()) if selected.any() else {}
+
+    report = []
+    for index in order:
+        pid = int(products.keys[index])
+        total = units_by_product[pid]
+        report.append({
+            'product_id': pid,
+            'name': names.get(pid),
+            'units': int(total),
+            'lines': int(products.get('lines')[index]),
+            'revenue': round(float(products.get('revenue')[index]), 2),
+            'temperature_mix': mix[pid],
+            'ingredients': [{
+                'id': iid,
+                'name': ingredient_names.get(iid),
+                'units': int(value),
+                'attach_rate': round(value / total, 4) if total else 0.0
+            } for iid, value in sorted(attach.get(pid, []), key=lambda x: (-x[1], x[0]))]
+        })
+    return report
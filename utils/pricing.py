@@ -0,0 +1,137 @@
+# 商品價格表
+import threading
+from array import array
+
+from flask import current_app
+
+from database import db
+from models import Product, ProductIngredient
+from utils.menu_cache import current_version
+
+# 每個商品在價格陣列中佔用的槽位順序
+TEMPERATURES = ('normal', 'cold', 'hot')
+_OFFSETS = {temperature: offset for offset, temperature in enumerate(TEMPERATURES)}
+_NO_INGREDIENTS = {}
+
+
+def _positive(value):
+    """將價格欄位轉為 float，未設定時返回 0"""
+    return float(value) if value is not None and value > 0 else 0.0
+
+
+class PriceTable:
+    """預先計算的實際售價表，以 (product_id, temperature) 查詢，並索引各商品的啟用配料"""
+
+    __slots__ = ('version', '_slots', '_prices', '_ingredients')
+
+    def __init__(self, version, rows, ingredient_rows=()):
+        self.version = version
+        self._slots = {}
+        self._prices = array('d')
+        self._ingredients = {}  # product_id -> {ingredient_id: (name, price)}
+        for ingredient_id, product_id, name, price in ingredient_rows:
+            self._ingredients.setdefault(product_id, {})[ingredient_id] = (name, float(price or 0))
+        for product_id, price, special_price, cold_price, hot_price in rows:
+            # 與 Product.get_price 相同：溫度價 > 特價 > 原價
+            base = _positive(special_price) or float(price or 0)
+            self._slots[product_id] = len(self._prices)
+            self._prices.extend((
+                base,
+                _positive(cold_price) or base,
+                _positive(hot_price) or base
+            ))
+
+    def get(self, product_id, temperature='normal'):
+        """查詢價格，商品不存在時返回 None"""
+        slot = self._slots.get(product_id)
+        if slot is None:
+            return None
+        return self._prices[slot + _OFFSETS.get(temperature, 0)]
+
+    def ingredient_price(self, product_id, ingredient_id):
+        """查詢啟用配料的價格，不存在或已停用時返回 0"""
+        ingredient = self._ingredients.get(product_id, _NO_INGREDIENTS).get(ingredient_id)
+        return ingredient[1] if ingredient else 0.0
+
+    def resolve_ingredients(self, product_id, ingredients):
+        """將配料 ID 解析為含名稱與價格的快照，忽略無效配料"""
+        index = self._ingredients.get(product_id, _NO_INGREDIENTS)
+        resolved = []
+        for ingredient in ingredients or ():
+            ingredient_id = ingredient.get('id') if isinstance(ingredient, dict) else ingredient
+            try:
+                ingredient_id = int(ingredient_id)
+            except (TypeError, ValueError):
+                continue
+            if ingredient_id in index:
+                name, price = index[ingredient_id]
+                resolved.append({'id': ingredient_id, 'name': name, 'price': price})
+        return resolved
+
+    def __contains__(self, product_id):
+        return product_id in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __repr__(self):
+        return f'<PriceTable v{self.version} products={len(self)}>'
+
+
+def _build_price_table(version):
+    """從資料庫建立價格表（包含已下架商品，購物車中可能仍有）"""
+    rows = db.session.query(
+        Product.id, Product.price, Product.special_price, Product.cold_price, Product.hot_price
+    ).all()
+    ingredient_rows = db.session.query(
+        ProductIngredient.id, ProductIngredient.product_id, ProductIngredient.name, ProductIngredient.price
+    ).filter(ProductIngredient.is_active.is_(True)).all()
+    return PriceTable(version, rows, ingredient_rows)
+
+
+def get_price_table():
+    """獲取當前菜單版本的價格表"""
+    state = current_app.extensions['pricing']
+    version = current_version()
+    table = state['table']
+    if table is not None and table.version == version:
+        return table
+
+    with state['lock']:
+        table = state['table']
+        if table is None or table.version != version:
+            table = _build_price_table(version)
+            state['table'] = table
+    return table
+
+
+def get_unit_price(product_id, temperature='normal', ingredients=None, table=None):
+    """獲取商品單價；傳入配料時一併計入配料價格"""
+    if table is None:
+        table = get_price_table()
+    price = table.get(product_id, temperature)
+    if price is None:
+        # 尚未提交的新商品不在價格表中
+        product = db.session.get(Product, product_id)
+        price = product.get_price(temperature) if product else 0.0
+
+    for ingredient in ingredients or ():
+        if isinstance(ingredient, dict):
+            # 加入購物車時已解析的配料快照
+            price += float(ingredient.get('price', 0))
+        else:
+            price += table.ingredient_price(product_id, ingredient)
+    return price
+
+
+def resolve_ingredients(product_id, ingredients):
+    """將客戶端提交的配料解析為快照（id、名稱、價格）"""
+    return get_price_table().resolve_ingredients(product_id, ingredients)
+
+
+def init_pricing(app):
+    """初始化價格表"""
+    app.extensions['pricing'] = {
+        'table': None,
+        'lock': threading.Lock()
+    }
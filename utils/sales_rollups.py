@@ -0,0 +1,173 @@
+# 銷售彙總（每小時 / 每日）
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import current_app, has_app_context
+from sqlalchemy import func, select
+
+from database import db
+from models import OrderItem, SalesDaily, SalesHourly
+from utils.order_archive import ORDER_TABLES
+
+GRANULARITIES = {
+    'hour': (SalesHourly, lambda moment: moment.replace(minute=0, second=0, microsecond=0)),
+    'day': (SalesDaily, lambda moment: moment.date())
+}
+METRICS = ('revenue', 'order_count', 'items_sold')
+UPSERT_CHUNK_SIZE = 500
+
+
+def _upsert_increments(model, rows):
+    """以 upsert 語句累加多個分桶的數值（每語句最多 UPSERT_CHUNK_SIZE 行）"""
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        _upsert_chunk(model, rows[start:start + UPSERT_CHUNK_SIZE])
+
+
+def _upsert_chunk(model, rows):
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['bucket', 'status', 'shard'],
+            set_={metric: getattr(model, metric) + getattr(stmt.excluded, metric) for metric in METRICS}
+        )
+        db.session.execute(stmt)
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(model).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            **{metric: getattr(model, metric) + getattr(stmt.inserted, metric) for metric in METRICS}
+        )
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            rollup = model.query.filter_by(bucket=row['bucket'], status=row['status'],
+                                           shard=row['shard']).first()
+            if rollup is None:
+                db.session.add(model(**row))
+            else:
+                for metric in METRICS:
+                    setattr(rollup, metric, getattr(rollup, metric) + row[metric])
+
+
+def _new_deltas():
+    return defaultdict(lambda: [Decimal('0'), 0, 0])
+
+
+def _accumulate(deltas, bucket_of, entry):
+    created_at, status, revenue, orders, items = entry
+    delta = deltas[(bucket_of(created_at), status)]
+    delta[0] += Decimal(str(revenue))
+    delta[1] += orders
+    delta[2] += items
+
+
+def _write_deltas(model, deltas, shard=0):
+    # 依 (分桶, 狀態) 排序寫入，並發交易以相同順序加鎖
+    _upsert_increments(model, [
+        {'bucket': bucket, 'status': status, 'shard': shard, 'revenue': revenue,
+         'order_count': orders, 'items_sold': items}
+        for (bucket, status), (revenue, orders, items) in sorted(deltas.items())
+    ])
+
+
+def apply_sales_deltas(entries):
+    """在當前交易中更新彙總（寫入隨機分片，並發下單不會在同一行上排隊）
+
+    entries 為 (訂單建立時間, 狀態, 營收, 訂單數, 商品數) 的列表，數值可為負。
+    """
+    shard = random.randrange(current_app.config.get('SALES_ROLLUP_SHARDS', 16)) \
+        if has_app_context() else 0
+    for model, bucket_of in GRANULARITIES.values():
+        deltas = _new_deltas()
+        for entry in entries:
+            _accumulate(deltas, bucket_of, entry)
+        _write_deltas(model, deltas, shard)
+
+
+def record_order_sales(order, items_sold):
+    """新訂單計入彙總"""
+    apply_sales_deltas([(order.created_at or datetime.utcnow(), order.status or 'pending',
+                         order.total_amount, 1, items_sold)])
+
+
+def move_order_sales(transitions):
+    """訂單狀態轉換：從舊狀態移到新狀態
+
+    transitions 為 (訂單ID, 建立時間, 舊狀態, 新狀態, 金額) 的列表。
+    """
+    if not transitions:
+        return
+    order_ids = [order_id for order_id, *_ in transitions]
+    items = dict(db.session.execute(
+        select(OrderItem.order_id, func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id.in_(order_ids))
+        .group_by(OrderItem.order_id)
+    ).all())
+    entries = []
+    for order_id, created_at, old_status, new_status, amount in transitions:
+        count = int(items.get(order_id) or 0)
+        entries.append((created_at, old_status, -amount, -1, -count))
+        entries.append((created_at, new_status, amount, 1, count))
+    apply_sales_deltas(entries)
+
+
+def rebuild_sales_rollups(batch_size=1000):
+    """由訂單（含歸檔）重新計算所有彙總並提交（首次部署或校正用），返回訂單數
+
+    結果寫入分片 0，其他分片清空。
+    """
+    # 串流讀取訂單，只在記憶體中保留彙總結果
+    totals = {name: _new_deltas() for name in GRANULARITIES}
+    count = 0
+    for order_model, item_model in ORDER_TABLES:
+        items = select(item_model.order_id, func.sum(item_model.quantity).label('items_sold')) \
+            .group_by(item_model.order_id).subquery()
+        query = select(order_model.created_at, order_model.status, order_model.total_amount,
+                       items.c.items_sold).outerjoin(items, items.c.order_id == order_model.id)
+        for row in db.session.execute(query.execution_options(yield_per=batch_size)):
+            entry = (row.created_at, row.status, row.total_amount, 1, int(row.items_sold or 0))
+            for name, (_, bucket_of) in GRANULARITIES.items():
+                _accumulate(totals[name], bucket_of, entry)
+            count += 1
+
+    for name, (model, _) in GRANULARITIES.items():
+        model.query.delete()
+        _write_deltas(model, totals[name])
+    db.session.commit()
+    return count
+
+
+def sales_series(granularity, metric, start, end, statuses):
+    """讀取 [start, end) 範圍內的彙總序列，缺少的分桶補 0，返回 [(分桶, 數值)]"""
+    model, bucket_of = GRANULARITIES[granularity]
+    column = getattr(model, metric)
+    first, last = bucket_of(start), bucket_of(end)
+    rows = dict(db.session.execute(
+        select(model.bucket, func.sum(column))
+        .where(model.bucket >= first, model.bucket < last, model.status.in_(statuses))
+        .group_by(model.bucket)
+    ).all())
+
+    step = timedelta(hours=1) if granularity == 'hour' else timedelta(days=1)
+    series = []
+    bucket = first
+    while bucket < last:
+        series.append((bucket, float(rows.get(bucket) or 0)))
+        bucket += step
+    return series
+
+
+def bucket_label(bucket):
+    """圖表 x 軸標籤"""
+    if isinstance(bucket, datetime):
+        return bucket.strftime('%Y-%m-%d %H:00')
+    if isinstance(bucket, date):
+        return bucket.isoformat()
+    return str(bucket)